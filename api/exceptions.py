@@ -21,7 +21,8 @@ def custom_exception_handler(exc, context):
         response.data = {
             "error": True,
             "message": str(exc),
-            "details": response.data if isinstance(response.data, dict) else {"detail": response.data},
+            # Plain dict rather than DRF's OrderedDict-based ReturnDict
+            "details": dict(response.data) if isinstance(response.data, dict) else {"detail": response.data},
             "status_code": response.status_code
         }
     else:
@@ -0,0 +1,35 @@
+"""
+orjson-backed JSON rendering for API responses
+"""
+from decimal import Decimal
+
+import orjson
+from django.utils.functional import Promise
+from rest_framework.renderers import JSONRenderer
+
+# Naive datetimes in this codebase are UTC (datetime.utcnow())
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_NAIVE_UTC | orjson.OPT_UTC_Z
+
+
+def _default(obj):
+    """Encode the few types orjson does not handle natively."""
+    if isinstance(obj, (Decimal, Promise)):
+        return str(obj)
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def dumps(data) -> bytes:
+    """Serialize data to JSON bytes with orjson."""
+    return orjson.dumps(data, default=_default, option=ORJSON_OPTIONS)
+
+
+class OrjsonRenderer(JSONRenderer):
+    """
+    Drop-in replacement for DRF's JSONRenderer using orjson.
+    datetime, date, UUID and dataclass values are serialized natively.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return dumps(data)
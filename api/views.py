@@ -9,8 +9,12 @@ This module provides REST API endpoints for:
 """
 import uuid
 import time
+import queue
+import asyncio
 import logging
+import threading
 from datetime import datetime
+from functools import lru_cache
 
 from rest_framework.views import APIView
 from rest_framework.response import Response
@@ -18,9 +22,13 @@ from rest_framework import status
 from rest_framework.permissions import AllowAny
 from drf_spectacular.utils import extend_schema, OpenApiExample
 
+from asgiref.sync import async_to_sync
 from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
 from django.db import connection
+from django.http import HttpResponse, StreamingHttpResponse
 
+from .renderers import dumps
 from .serializers import (
     ChatRequestSerializer,
     ChatResponseSerializer,
@@ -29,11 +37,304 @@ from .serializers import (
     HealthCheckSerializer,
     ConversationHistorySerializer,
 )
+from apps.core.utils import elapsed_ms, normalize_for_json
 from apps.orchestrator.graph import OrchestratorService
+from apps.shopcore.agent import ShopCoreAgent
+from apps.shipstream.agent import ShipStreamAgent
+from apps.payguard.agent import PayGuardAgent
+from apps.caredesk.agent import CareDeSkAgent
 
 logger = logging.getLogger(__name__)
 
 
+# Agent lookup table, resolved once at import
+AGENT_CLASSES = {
+    'shopcore': ShopCoreAgent,
+    'shipstream': ShipStreamAgent,
+    'payguard': PayGuardAgent,
+    'caredesk': CareDeSkAgent,
+}
+
+
+def json_response(data, status_code: int = status.HTTP_200_OK) -> HttpResponse:
+    """
+    Serialize a trusted, server-built payload straight to JSON.
+    
+    Response serializers are kept for the OpenAPI schema only; rendering
+    through orjson skips DRF's renderer and to_representation walk.
+    """
+    return HttpResponse(
+        dumps(data),
+        status=status_code,
+        content_type="application/json"
+    )
+
+
+def generate_ndjson(response_data: dict, agent_results: list):
+    """
+    Yield a chat result as newline-delimited JSON: the response envelope
+    first, then one line per agent data row.
+    """
+    yield dumps(response_data) + b"\n"
+    for agent_result in agent_results:
+        agent_name = agent_result.get("agent_name")
+        rows = agent_result.get("data") or []
+        if isinstance(rows, dict):
+            rows = [rows]
+        for row in rows:
+            yield dumps({"agent": agent_name, "row": row}) + b"\n"
+
+
+async def _client_events(events, include_debug: bool = False):
+    """
+    Convert orchestrator progress events to JSON-ready dicts. The closing
+    "final" event carries the same body as the non-streaming response.
+    """
+    async for event in events:
+        if event["event"] == "final":
+            result = event["result"]
+            event = {"event": "final", "result": _chat_response_data(result, include_debug)}
+        yield normalize_for_json(event)
+
+
+async def generate_event_ndjson(events, include_debug: bool = False):
+    """Yield orchestrator progress events as newline-delimited JSON as they happen."""
+    async for event in _client_events(events, include_debug):
+        yield dumps(event) + b"\n"
+
+
+async def generate_event_sse(events, include_debug: bool = False):
+    """
+    Yield orchestrator progress events as Server-Sent Events, named after
+    the event type, so browsers can consume them with EventSource.
+    """
+    async for event in _client_events(events, include_debug):
+        yield b"event: " + event["event"].encode() + b"\ndata: " + dumps(event) + b"\n\n"
+
+
+_STREAM_END = object()
+
+
+def iter_async_in_thread(chunks_async):
+    """
+    Sync iterator over an async generator, for WSGI: a worker thread runs
+    it on its own event loop (via async_to_sync, like process_query) and
+    hands each chunk over through a queue as soon as it is produced.
+    
+    Handing the async generator to StreamingHttpResponse under WSGI would
+    make Django collect it into a list first, so nothing would be sent
+    until the graph finished. Closing the iterator (client disconnect)
+    cancels the run.
+    """
+    chunks = queue.Queue()
+    running = {}
+    
+    async def pump():
+        running["loop"] = asyncio.get_running_loop()
+        running["task"] = asyncio.current_task()
+        try:
+            async for chunk in chunks_async:
+                chunks.put(chunk)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            chunks.put(e)
+        finally:
+            await chunks_async.aclose()
+            chunks.put(_STREAM_END)
+    
+    worker = threading.Thread(target=async_to_sync(pump), daemon=True)
+    worker.start()
+    try:
+        while (chunk := chunks.get()) is not _STREAM_END:
+            if isinstance(chunk, Exception):
+                raise chunk
+            yield chunk
+    finally:
+        if worker.is_alive() and "task" in running:
+            try:
+                running["loop"].call_soon_threadsafe(running["task"].cancel)
+            except RuntimeError:
+                pass  # The loop closed in the meantime
+
+
+def event_stream_response(events, include_debug: bool = False, sse: bool = False,
+                          asgi: bool = True) -> StreamingHttpResponse:
+    """
+    Stream progress events; proxy buffering is disabled so tokens arrive as
+    generated. ASGI servers consume the async generator directly; under
+    WSGI it is bridged to a sync iterator by iter_async_in_thread.
+    """
+    if sse:
+        content, content_type = generate_event_sse(events, include_debug), "text/event-stream"
+    else:
+        content, content_type = generate_event_ndjson(events, include_debug), "application/x-ndjson"
+    if not asgi:
+        content = iter_async_in_thread(content)
+    
+    response = StreamingHttpResponse(content, content_type=content_type)
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+def _chat_response_data(result: dict, include_debug: bool = False) -> dict:
+    """Build the chat response body from an orchestrator result."""
+    response_data = {
+        "response": result['response'],
+        "session_id": result['session_id'],
+        "agents_used": result['agents_used'],
+        "success": result['success'],
+        "intent": result.get('intent'),
+        "intent_confidence": result.get('intent_confidence', 0),
+    }
+    
+    # Include debug info if requested
+    if include_debug:
+        # Pre-normalize once so rendering only sees JSON primitives
+        response_data["execution_details"] = normalize_for_json(result.get('execution_details', {}))
+        response_data["error"] = result.get('error')
+    
+    return response_data
+
+
+# === Request validation ===
+# Request serializers document the schema; validation is done directly
+# since the payloads are a handful of scalar fields.
+
+_TRUE_VALUES = {True, 1, 'true', 'True', 'TRUE', 't', 'T', '1', 'yes', 'on'}
+_FALSE_VALUES = {False, 0, 'false', 'False', 'FALSE', 'f', 'F', '0', 'no', 'off'}
+
+
+def _clean_str(data: dict, field: str, errors: dict, max_length: int,
+               required: bool = False, allow_null: bool = False):
+    """Validate an optional/required string field the way DRF's CharField does."""
+    if field not in data:
+        if required:
+            errors[field] = ["This field is required."]
+        return None
+    
+    value = data[field]
+    if value is None:
+        if not allow_null:
+            errors[field] = ["This field may not be null."]
+        return None
+    if isinstance(value, bool) or not isinstance(value, (str, int, float)):
+        errors[field] = ["Not a valid string."]
+        return None
+    
+    value = str(value).strip()
+    if not value:
+        errors[field] = ["This field may not be blank."]
+    elif len(value) > max_length:
+        errors[field] = [f"Ensure this field has no more than {max_length} characters."]
+    return value
+
+
+def _invalid_request(errors: dict) -> HttpResponse:
+    return json_response(
+        {"error": "Invalid request", "details": errors},
+        status_code=status.HTTP_400_BAD_REQUEST
+    )
+
+
+def _validate_chat(request):
+    """Validate a chat request body. Returns (data, error_response)."""
+    payload = request.data
+    if not isinstance(payload, dict):
+        return None, _invalid_request({"non_field_errors": ["Invalid data. Expected a dictionary."]})
+    
+    errors = {}
+    data = {
+        "message": _clean_str(payload, "message", errors, 2000, required=True),
+        "session_id": _clean_str(payload, "session_id", errors, 100),
+        "user_id": _clean_str(payload, "user_id", errors, 100, allow_null=True),
+        "include_debug": False,
+    }
+    
+    include_debug = payload.get("include_debug", False)
+    if not isinstance(include_debug, (bool, int, str)):
+        errors["include_debug"] = ["Must be a valid boolean."]
+    elif include_debug in _TRUE_VALUES:
+        data["include_debug"] = True
+    elif include_debug not in _FALSE_VALUES:
+        errors["include_debug"] = ["Must be a valid boolean."]
+    
+    if errors:
+        return None, _invalid_request(errors)
+    return data, None
+
+
+def _validate_direct_query(request):
+    """Validate a direct agent query body. Returns (data, error_response)."""
+    payload = request.data
+    if not isinstance(payload, dict):
+        return None, _invalid_request({"non_field_errors": ["Invalid data. Expected a dictionary."]})
+    
+    errors = {}
+    agent = payload.get("agent")
+    if "agent" not in payload:
+        errors["agent"] = ["This field is required."]
+    elif not isinstance(agent, str) or agent not in AGENT_CLASSES:
+        errors["agent"] = [f'"{agent}" is not a valid choice.']
+    
+    query = _clean_str(payload, "query", errors, 2000, required=True)
+    
+    context = payload.get("context", {})
+    if not isinstance(context, dict):
+        errors["context"] = [f'Expected a dictionary of items but got type "{type(context).__name__}".']
+    
+    if errors:
+        return None, _invalid_request(errors)
+    return {"agent": agent, "query": query, "context": context}, None
+
+
+# Health probes arrive every few seconds from load balancers; reuse the
+# DB check result for a short window unless ?fresh=1 is passed.
+DB_PROBE_TTL_SECONDS = 5.0
+_db_probe = {"checked_at": None, "status": None}
+
+
+def _probe_database(fresh: bool = False) -> str:
+    """Run SELECT 1 against the default DB, caching the outcome briefly."""
+    now = time.monotonic()
+    checked_at = _db_probe["checked_at"]
+    if not fresh and checked_at is not None and now - checked_at < DB_PROBE_TTL_SECONDS:
+        return _db_probe["status"]
+    
+    db_status = "healthy"
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1")
+    except Exception as e:
+        db_status = f"unhealthy: {str(e)}"
+    
+    _db_probe["checked_at"] = now
+    _db_probe["status"] = db_status
+    return db_status
+
+
+_orchestrator = None
+_orchestrator_lock = threading.Lock()
+
+
+def get_orchestrator() -> OrchestratorService:
+    """Return the process-wide OrchestratorService, creating it on first use."""
+    global _orchestrator
+    if _orchestrator is None:
+        with _orchestrator_lock:
+            if _orchestrator is None:
+                _orchestrator = OrchestratorService()
+    return _orchestrator
+
+
+@lru_cache(maxsize=None)
+def _get_agent(agent_name: str):
+    """Return a cached agent instance by name (built once per process)."""
+    agent_class = AGENT_CLASSES.get(agent_name)
+    return agent_class() if agent_class else None
+
+
 class ChatView(APIView):
     """
     Main chat endpoint for customer queries.
@@ -76,25 +377,37 @@ class ChatView(APIView):
         """
         Process a customer query.
         """
-        serializer = ChatRequestSerializer(data=request.data)
+        data, error_response = _validate_chat(request)
+        if error_response is not None:
+            return error_response
         
-        if not serializer.is_valid():
-            return Response(
-                {"error": "Invalid request", "details": serializer.errors},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
-        data = serializer.validated_data
         message = data['message']
         session_id = data.get('session_id') or str(uuid.uuid4())
         user_id = data.get('user_id')
         include_debug = data.get('include_debug', False)
+        stream = request.query_params.get('stream')
         
         logger.info(f"Chat request - Session: {session_id}, Message: {message[:100]}...")
         
         try:
-            # Initialize orchestrator and process query
-            orchestrator = OrchestratorService()
+            # Reuse the process-wide orchestrator
+            orchestrator = get_orchestrator()
+            
+            if stream in ('events', 'sse'):
+                # Opt-in (?stream=events, or ?stream=sse for EventSource):
+                # node progress and answer tokens are sent while the graph
+                # runs, the full result last
+                events = orchestrator.process_query_stream(
+                    query=message,
+                    session_id=session_id,
+                    conversation_history=[]  # TODO: Load from storage
+                )
+                return event_stream_response(
+                    events, include_debug,
+                    sse=stream == 'sse',
+                    asgi=isinstance(request._request, ASGIRequest)
+                )
+            
             result = orchestrator.process_query(
                 query=message,
                 session_id=session_id,
@@ -102,27 +415,29 @@ class ChatView(APIView):
             )
             
             # Build response
-            response_data = {
-                "response": result['response'],
-                "session_id": session_id,
-                "agents_used": result['agents_used'],
-                "success": result['success'],
-                "intent": result.get('intent'),
-                "intent_confidence": result.get('intent_confidence', 0),
-            }
-            
-            # Include debug info if requested
-            if include_debug:
-                response_data["execution_details"] = result.get('execution_details', {})
-                response_data["error"] = result.get('error')
+            response_data = _chat_response_data(result, include_debug)
             
             logger.info(f"Chat response - Agents used: {result['agents_used']}, Success: {result['success']}")
             
-            return Response(response_data, status=status.HTTP_200_OK)
+            if stream == '1':
+                # Opt-in (?stream=1): rows follow the envelope instead of
+                # being embedded in it
+                agent_results = result.get('execution_details', {}).get('agent_results', [])
+                if include_debug:
+                    response_data["execution_details"] = {
+                        key: value for key, value in response_data["execution_details"].items()
+                        if key != "agent_results"
+                    }
+                return StreamingHttpResponse(
+                    generate_ndjson(response_data, agent_results),
+                    content_type="application/x-ndjson"
+                )
+            
+            return json_response(response_data)
             
         except Exception as e:
             logger.error(f"Error processing chat request: {e}")
-            return Response(
+            return json_response(
                 {
                     "response": "I apologize, but I encountered an error processing your request. Please try again.",
                     "session_id": session_id,
@@ -132,7 +447,7 @@ class ChatView(APIView):
                     "intent_confidence": 0,
                     "error": str(e)
                 },
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
 
@@ -154,45 +469,29 @@ class DirectAgentQueryView(APIView):
         """
         Execute a direct query against a specific agent.
         """
-        serializer = DirectQueryRequestSerializer(data=request.data)
-        
-        if not serializer.is_valid():
-            return Response(
-                {"error": "Invalid request", "details": serializer.errors},
-                status=status.HTTP_400_BAD_REQUEST
-            )
+        data, error_response = _validate_direct_query(request)
+        if error_response is not None:
+            return error_response
         
-        data = serializer.validated_data
         agent_name = data['agent']
         query = data['query']
-        context = data.get('context', {})
+        context = data['context']
         
         logger.info(f"Direct query to {agent_name}: {query[:100]}...")
         
         try:
-            # Import and instantiate the appropriate agent
-            if agent_name == 'shopcore':
-                from apps.shopcore.agent import ShopCoreAgent
-                agent = ShopCoreAgent()
-            elif agent_name == 'shipstream':
-                from apps.shipstream.agent import ShipStreamAgent
-                agent = ShipStreamAgent()
-            elif agent_name == 'payguard':
-                from apps.payguard.agent import PayGuardAgent
-                agent = PayGuardAgent()
-            elif agent_name == 'caredesk':
-                from apps.caredesk.agent import CareDeSkAgent
-                agent = CareDeSkAgent()
-            else:
+            # Look up the cached agent instance
+            agent = _get_agent(agent_name)
+            if agent is None:
                 return Response(
                     {"error": f"Unknown agent: {agent_name}"},
                     status=status.HTTP_400_BAD_REQUEST
                 )
             
             # Execute the query
-            start_time = time.time()
+            start_ns = time.perf_counter_ns()
             result = agent.execute(query=query, context=context, entities=[])
-            execution_time_ms = int((time.time() - start_time) * 1000)
+            execution_time_ms = int(elapsed_ms(start_ns))
             
             response_data = {
                 "agent": agent_name,
@@ -203,11 +502,11 @@ class DirectAgentQueryView(APIView):
                 "execution_time_ms": execution_time_ms
             }
             
-            return Response(response_data, status=status.HTTP_200_OK)
+            return json_response(response_data)
             
         except Exception as e:
             logger.error(f"Error in direct agent query: {e}")
-            return Response(
+            return json_response(
                 {
                     "agent": agent_name,
                     "success": False,
@@ -216,7 +515,7 @@ class DirectAgentQueryView(APIView):
                     "error": str(e),
                     "execution_time_ms": 0
                 },
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
 
@@ -258,29 +557,11 @@ class HealthCheckView(APIView):
         """
         Check system health.
         """
-        # Check database connectivity
-        db_status = "healthy"
-        try:
-            with connection.cursor() as cursor:
-                cursor.execute("SELECT 1")
-        except Exception as e:
-            db_status = f"unhealthy: {str(e)}"
+        # Check database connectivity (cached briefly, ?fresh=1 forces a probe)
+        db_status = _probe_database(fresh=request.query_params.get('fresh') == '1')
         
-        # Check agents
-        agents_status = {}
-        agent_classes = [
-            ('shopcore', 'apps.shopcore.agent', 'ShopCoreAgent'),
-            ('shipstream', 'apps.shipstream.agent', 'ShipStreamAgent'),
-            ('payguard', 'apps.payguard.agent', 'PayGuardAgent'),
-            ('caredesk', 'apps.caredesk.agent', 'CareDeSkAgent'),
-        ]
-        
-        for name, module, class_name in agent_classes:
-            try:
-                exec(f"from {module} import {class_name}")
-                agents_status[name] = "ready"
-            except Exception as e:
-                agents_status[name] = f"error: {str(e)}"
+        # Check agents (classes are imported with this module)
+        agents_status = {name: "ready" for name in AGENT_CLASSES}
         
         # Check LLM configuration (GitHub Models API)
         llm_status = "configured" if settings.GITHUB_TOKEN else "not configured"
@@ -291,10 +572,10 @@ class HealthCheckView(APIView):
             "database": db_status,
             "llm": llm_status,
             "agents": agents_status,
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": datetime.utcnow()  # orjson encodes datetimes natively
         }
         
-        return Response(response_data, status=status.HTTP_200_OK)
+        return json_response(response_data)
 
 
 class CustomerListView(APIView):
@@ -6,23 +6,43 @@ This agent handles queries related to:
 - Ticket messages and history
 - Customer satisfaction surveys
 """
-import json
 import logging
 import re
-from typing import Dict, List, Any, Optional
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, List, Any, Optional, Tuple
 
 from django.db import connection
-from langchain_openai import ChatOpenAI
+from django.db.models import Count
 from langchain_core.messages import SystemMessage, HumanMessage
 
 from django.conf import settings
-from apps.core.utils import sanitize_sql, extract_json_from_response
+from apps.core.llm import get_process_llm
+from apps.core.utils import sanitize_sql, extract_json_from_response, rows_to_dicts, iter_cursor_rows
 from apps.core.exceptions import SQLGenerationException, SQLExecutionException
 from .schemas import get_schema_prompt, CAREDESK_SCHEMA
 from .models import Ticket, TicketMessage, SatisfactionSurvey
+from .choices import TicketStatus, ReferenceType
 
 logger = logging.getLogger(__name__)
 
+# Fallback for LLM replies that contain bare SQL instead of the JSON envelope
+_SELECT_RE = re.compile(r'SELECT[^;]+', re.IGNORECASE | re.DOTALL)
+
+# LLM-generated SQL per rendered prompt (the prompt encodes the query and all
+# context used), least recently used first. Agents run on worker threads.
+_SQL_CACHE_SIZE = 256
+_sql_cache: "OrderedDict[str, Optional[str]]" = OrderedDict()
+_sql_cache_lock = threading.Lock()
+
+
+def _forget_sql(sql: str):
+    """Evict cached prompts that produced this SQL, so a failing query is regenerated."""
+    with _sql_cache_lock:
+        for prompt in [prompt for prompt, cached in _sql_cache.items() if cached == sql]:
+            del _sql_cache[prompt]
+
 
 CAREDESK_SYSTEM_PROMPT = """You are a SQL expert for the CareDesk customer support database.
 Your job is to convert natural language queries into safe, read-only SQL queries.
@@ -36,6 +56,7 @@ IMPORTANT RULES:
 4. Tickets can reference orders via reference_id where reference_type = 'order'
 5. Table names: caredesk_tickets, caredesk_ticket_messages, caredesk_satisfaction_surveys
 6. caredesk_tickets.user_id links to shopcore_users.id
+7. Filter caredesk_ticket_messages with is_internal = false when showing a customer their thread
 
 When returning results, format as JSON:
 {{
@@ -45,21 +66,58 @@ When returning results, format as JSON:
 """
 
 
+# ORM fallback branches in priority order, with the keywords that select them
+_FALLBACK_BRANCHES = (
+    ('tickets', ('ticket', 'support', 'issue', 'help', 'assigned', 'agent')),
+    ('messages', ('message', 'conversation', 'reply', 'response')),
+    ('surveys', ('survey', 'satisfaction', 'rating', 'feedback')),
+    ('open', ('open', 'pending', 'active', 'waiting')),
+)
+_KEYWORD_BUCKETS = {kw: bucket for bucket, keywords in _FALLBACK_BRANCHES for kw in keywords}
+_BUCKET_PRIORITY = {bucket: i for i, (bucket, _) in enumerate(_FALLBACK_BRANCHES)}
+_KEYWORD_RE = re.compile('|'.join(re.escape(kw) for kw in _KEYWORD_BUCKETS))
+
+
+@lru_cache(maxsize=512)
+def _classify_fallback_query(query_lower: str) -> str:
+    """
+    Pick the ORM fallback branch for a lowercased query in a single scan.
+    Keywords match as substrings; the highest-priority branch found wins.
+    """
+    best = None
+    for match in _KEYWORD_RE.finditer(query_lower):
+        priority = _BUCKET_PRIORITY[_KEYWORD_BUCKETS[match.group()]]
+        if priority == 0:
+            return _FALLBACK_BRANCHES[0][0]
+        if best is None or priority < best:
+            best = priority
+    return _FALLBACK_BRANCHES[best][0] if best is not None else 'default'
+
+
 class CareDeSkAgent:
     """
     Text-to-SQL agent for CareDesk database.
     Handles: Tickets, TicketMessages, SatisfactionSurveys
     """
     
+    name = "caredesk"
+    CAPABILITIES = (
+        "Find ticket status for an order",
+        "Check if ticket is assigned to agent",
+        "View ticket conversation history",
+        "Get customer satisfaction rating",
+        "List open tickets for a user",
+    )
+    
+    # Schema prompt is derived from a module constant - build it once per class
+    schema_prompt = get_schema_prompt()
+    
     def __init__(self):
-        self.name = "caredesk"
-        self.llm = ChatOpenAI(
-            model=settings.LLM_MODEL,
-            api_key=settings.GITHUB_TOKEN,
-            base_url=settings.LLM_BASE_URL,
-            temperature=0,
+        self.llm = get_process_llm(settings.LLM_MODEL)
+        # The rendered system prompt never changes - build the message once
+        self._system_message = SystemMessage(
+            content=CAREDESK_SYSTEM_PROMPT.format(schema=self.schema_prompt)
         )
-        self.schema_prompt = get_schema_prompt()
     
     def execute(
         self,
@@ -86,7 +144,8 @@ class CareDeSkAgent:
                             "sql_query": sql_query,
                             "error": None
                         }
-                except Exception as e:
+                except SQLExecutionException as e:
+                    _forget_sql(sql_query)
                     logger.warning(f"SQL execution failed, trying ORM fallback: {e}")
             
             # Fallback to ORM-based queries
@@ -126,104 +185,123 @@ class CareDeSkAgent:
                 user_id = user_id or shopcore_data[0].get('user_id')
                 order_id = order_id or shopcore_data[0].get('order_id')
         
+        branch = _classify_fallback_query(query_lower)
+        
         # Ticket status queries
-        if any(word in query_lower for word in ['ticket', 'support', 'issue', 'help', 'assigned', 'agent']):
-            tickets = Ticket.objects.all().order_by('-created_at')
-            
-            if ticket_id:
-                tickets = tickets.filter(id=ticket_id)
-            elif user_id:
-                tickets = tickets.filter(user_id=user_id)
-            elif order_id:
-                tickets = tickets.filter(reference_id=order_id, reference_type='order')
+        if branch == 'tickets':
+            tickets = self._ticket_qs(user_id, order_id, ticket_id).annotate(
+                message_count=Count('messages')
+            ).values(
+                'id', 'subject', 'status', 'priority', 'issue_type', 'assigned_agent_name',
+                'created_at', 'reference_id', 'reference_type', 'message_count'
+            )
             
             for ticket in tickets[:5]:
-                # Get message count
-                msg_count = TicketMessage.objects.filter(ticket=ticket).count()
-                
                 results.append({
-                    'ticket_id': str(ticket.id),
-                    'subject': ticket.subject,
-                    'status': ticket.status,
-                    'priority': ticket.priority,
-                    'issue_type': ticket.issue_type,
-                    'assigned_to': ticket.assigned_agent_name or 'Unassigned',
-                    'created_at': ticket.created_at.isoformat(),
-                    'reference_order': str(ticket.reference_id) if ticket.reference_type == 'order' else None,
-                    'message_count': msg_count
+                    'ticket_id': str(ticket['id']),
+                    'subject': ticket['subject'],
+                    'status': ticket['status'],
+                    'priority': ticket['priority'],
+                    'issue_type': ticket['issue_type'],
+                    'assigned_to': ticket['assigned_agent_name'] or 'Unassigned',
+                    'created_at': ticket['created_at'].isoformat(),
+                    'reference_order': str(ticket['reference_id']) if ticket['reference_type'] == ReferenceType.ORDER else None,
+                    'message_count': ticket['message_count']
                 })
         
         # Ticket messages/conversation
-        elif any(word in query_lower for word in ['message', 'conversation', 'reply', 'response']):
+        elif branch == 'messages':
+            # Internal notes are never shown to customers
+            messages = TicketMessage.objects.filter(is_internal=False).order_by('-created_at')
+            
             if ticket_id:
-                messages = TicketMessage.objects.filter(ticket_id=ticket_id).order_by('-created_at')[:10]
+                messages = messages.filter(ticket_id=ticket_id)
             elif user_id:
-                tickets = Ticket.objects.filter(user_id=user_id)
-                messages = TicketMessage.objects.filter(ticket__in=tickets).order_by('-created_at')[:10]
-            else:
-                messages = TicketMessage.objects.all().order_by('-created_at')[:10]
+                messages = messages.filter(ticket__user_id=user_id)
+            
+            messages = messages.values('id', 'ticket_id', 'sender', 'sender_name', 'content', 'created_at')
             
-            for msg in messages:
+            for msg in messages[:10]:
+                content = msg['content']
                 results.append({
-                    'message_id': str(msg.id),
-                    'ticket_id': str(msg.ticket_id),
-                    'sender': msg.sender,
-                    'sender_name': msg.sender_name,
-                    'content': msg.content[:200] + '...' if len(msg.content) > 200 else msg.content,
-                    'sent_at': msg.created_at.isoformat()
+                    'message_id': str(msg['id']),
+                    'ticket_id': str(msg['ticket_id']),
+                    'sender': msg['sender'],
+                    'sender_name': msg['sender_name'],
+                    'content': content[:200] + '...' if len(content) > 200 else content,
+                    'sent_at': msg['created_at'].isoformat()
                 })
         
         # Survey/feedback queries
-        elif any(word in query_lower for word in ['survey', 'satisfaction', 'rating', 'feedback']):
-            surveys = SatisfactionSurvey.objects.select_related('ticket').all()
+        elif branch == 'surveys':
+            surveys = SatisfactionSurvey.objects.all()
             
             if ticket_id:
                 surveys = surveys.filter(ticket_id=ticket_id)
             elif user_id:
                 surveys = surveys.filter(ticket__user_id=user_id)
             
+            surveys = surveys.values('id', 'ticket_id', 'rating', 'would_recommend', 'comments', 'created_at')
+            
             for survey in surveys[:5]:
                 results.append({
-                    'survey_id': str(survey.id),
-                    'ticket_id': str(survey.ticket_id),
-                    'rating': survey.rating,
-                    'would_recommend': survey.would_recommend,
-                    'comments': survey.comments,
-                    'submitted_at': survey.created_at.isoformat()
+                    'survey_id': str(survey['id']),
+                    'ticket_id': str(survey['ticket_id']),
+                    'rating': survey['rating'],
+                    'would_recommend': survey['would_recommend'],
+                    'comments': survey['comments'],
+                    'submitted_at': survey['created_at'].isoformat()
                 })
         
         # Open/pending tickets
-        elif any(word in query_lower for word in ['open', 'pending', 'active', 'waiting']):
-            tickets = Ticket.objects.filter(status__in=['open', 'in_progress']).order_by('-created_at')
-            
-            if user_id:
-                tickets = tickets.filter(user_id=user_id)
+        elif branch == 'open':
+            tickets = self._ticket_qs(user_id=user_id).filter(
+                status__in=[TicketStatus.OPEN, TicketStatus.IN_PROGRESS]
+            ).values('id', 'subject', 'status', 'priority', 'assigned_agent_name', 'created_at')
             
             for ticket in tickets[:5]:
                 results.append({
-                    'ticket_id': str(ticket.id),
-                    'subject': ticket.subject,
-                    'status': ticket.status,
-                    'priority': ticket.priority,
-                    'assigned_to': ticket.assigned_agent_name or 'Unassigned',
-                    'created_at': ticket.created_at.isoformat()
+                    'ticket_id': str(ticket['id']),
+                    'subject': ticket['subject'],
+                    'status': ticket['status'],
+                    'priority': ticket['priority'],
+                    'assigned_to': ticket['assigned_agent_name'] or 'Unassigned',
+                    'created_at': ticket['created_at'].isoformat()
                 })
         
         # Default: show recent tickets
         else:
-            tickets = Ticket.objects.all().order_by('-created_at')[:5]
-            for ticket in tickets:
+            tickets = self._ticket_qs().values(
+                'id', 'subject', 'status', 'issue_type', 'assigned_agent_name', 'created_at'
+            )
+            for ticket in tickets[:5]:
                 results.append({
-                    'ticket_id': str(ticket.id),
-                    'subject': ticket.subject,
-                    'status': ticket.status,
-                    'issue_type': ticket.issue_type,
-                    'assigned_to': ticket.assigned_agent_name or 'Unassigned',
-                    'created_at': ticket.created_at.isoformat()
+                    'ticket_id': str(ticket['id']),
+                    'subject': ticket['subject'],
+                    'status': ticket['status'],
+                    'issue_type': ticket['issue_type'],
+                    'assigned_to': ticket['assigned_agent_name'] or 'Unassigned',
+                    'created_at': ticket['created_at'].isoformat()
                 })
         
         return results
     
+    @staticmethod
+    def _ticket_qs(user_id: str = None, order_id: str = None, ticket_id: str = None):
+        """
+        Recent tickets scoped by the most specific identifier available
+        (ticket, then user, then referenced order).
+        """
+        tickets = Ticket.objects.order_by('-created_at')
+        
+        if ticket_id:
+            return tickets.filter(id=ticket_id)
+        if user_id:
+            return tickets.filter(user_id=user_id)
+        if order_id:
+            return tickets.filter(reference_id=order_id, reference_type=ReferenceType.ORDER)
+        return tickets
+    
     def _generate_sql(
         self,
         query: str,
@@ -264,29 +342,52 @@ Generate a SQL query to answer this question. Only query the caredesk_* tables.
 """
         
         try:
-            response = self.llm.invoke([
-                SystemMessage(content=CAREDESK_SYSTEM_PROMPT.format(schema=self.schema_prompt)),
-                HumanMessage(content=user_prompt)
-            ])
-            
-            result = extract_json_from_response(response.content)
-            
-            if result and 'sql' in result:
-                sql = result['sql']
-            else:
-                sql_match = re.search(r'SELECT[^;]+', response.content, re.IGNORECASE | re.DOTALL)
-                if sql_match:
-                    sql = sql_match.group(0)
-                else:
-                    return None
-            
-            sql = sanitize_sql(sql)
-            logger.info(f"Generated SQL: {sql}")
-            return sql
-            
+            sql = self._sql_for_prompt(user_prompt)
         except Exception as e:
             logger.error(f"Error generating SQL: {e}")
             return None
+        
+        if sql:
+            logger.info(f"Generated SQL: {sql}")
+        return sql
+    
+    def _sql_for_prompt(self, user_prompt: str) -> Optional[str]:
+        """
+        SQL for a rendered prompt, from _sql_cache when an identical prompt
+        was answered before. LLM failures raise and are therefore not cached;
+        SQL that fails to execute is evicted by execute().
+        """
+        with _sql_cache_lock:
+            if user_prompt in _sql_cache:
+                _sql_cache.move_to_end(user_prompt)
+                return _sql_cache[user_prompt]
+        
+        sql = self._request_sql(user_prompt)
+        
+        with _sql_cache_lock:
+            _sql_cache[user_prompt] = sql
+            if len(_sql_cache) > _SQL_CACHE_SIZE:
+                _sql_cache.popitem(last=False)
+        return sql
+    
+    def _request_sql(self, user_prompt: str) -> Optional[str]:
+        """LLM round-trip for a rendered prompt."""
+        response = self.llm.invoke([
+            self._system_message,
+            HumanMessage(content=user_prompt)
+        ])
+        
+        result = extract_json_from_response(response.content)
+        
+        if result and 'sql' in result:
+            sql = result['sql']
+        else:
+            sql_match = _SELECT_RE.search(response.content)
+            if not sql_match:
+                return None
+            sql = sql_match.group(0)
+        
+        return sanitize_sql(sql)
     
     def _execute_sql(self, sql: str) -> List[Dict]:
         """Execute SQL query safely and return results."""
@@ -294,19 +395,7 @@ Generate a SQL query to answer this question. Only query the caredesk_* tables.
             with connection.cursor() as cursor:
                 cursor.execute(sql)
                 columns = [col[0] for col in cursor.description] if cursor.description else []
-                rows = cursor.fetchall()
-                
-                results = []
-                for row in rows:
-                    result = {}
-                    for i, col in enumerate(columns):
-                        value = row[i]
-                        if hasattr(value, 'isoformat'):
-                            value = value.isoformat()
-                        elif hasattr(value, '__str__'):
-                            value = str(value)
-                        result[col] = value
-                    results.append(result)
+                results = rows_to_dicts(columns, iter_cursor_rows(cursor))
                 
                 logger.info(f"SQL returned {len(results)} rows")
                 return results
@@ -315,12 +404,6 @@ Generate a SQL query to answer this question. Only query the caredesk_* tables.
             logger.error(f"Error executing SQL: {e}")
             raise SQLExecutionException(self.name, sql, str(e))
     
-    def get_capabilities(self) -> List[str]:
-        """Return list of capabilities this agent supports."""
-        return [
-            "Find ticket status for an order",
-            "Check if ticket is assigned to agent",
-            "View ticket conversation history",
-            "Get customer satisfaction rating",
-            "List open tickets for a user",
-        ]
+    def get_capabilities(self) -> Tuple[str, ...]:
+        """Return the capabilities this agent supports."""
+        return self.CAPABILITIES
@@ -0,0 +1,48 @@
+"""
+CareDesk enumerations
+Shared by the models and the schema prompt so valid values never drift apart
+"""
+from django.db import models
+
+
+class TicketStatus(models.TextChoices):
+    OPEN = 'open', 'Open'
+    IN_PROGRESS = 'in_progress', 'In Progress'
+    WAITING_CUSTOMER = 'waiting_customer', 'Waiting on Customer'
+    WAITING_INTERNAL = 'waiting_internal', 'Waiting on Internal Team'
+    RESOLVED = 'resolved', 'Resolved'
+    CLOSED = 'closed', 'Closed'
+
+
+class IssueType(models.TextChoices):
+    ORDER = 'order', 'Order Issue'
+    DELIVERY = 'delivery', 'Delivery Issue'
+    PAYMENT = 'payment', 'Payment Issue'
+    REFUND = 'refund', 'Refund Request'
+    PRODUCT = 'product', 'Product Issue'
+    ACCOUNT = 'account', 'Account Issue'
+    GENERAL = 'general', 'General Inquiry'
+    COMPLAINT = 'complaint', 'Complaint'
+    FEEDBACK = 'feedback', 'Feedback'
+
+
+class TicketPriority(models.TextChoices):
+    LOW = 'low', 'Low'
+    MEDIUM = 'medium', 'Medium'
+    HIGH = 'high', 'High'
+    URGENT = 'urgent', 'Urgent'
+
+
+class ReferenceType(models.TextChoices):
+    ORDER = 'order', 'Order'
+    TRANSACTION = 'transaction', 'Transaction'
+    SHIPMENT = 'shipment', 'Shipment'
+    PRODUCT = 'product', 'Product'
+    OTHER = 'other', 'Other'
+
+
+class MessageSender(models.TextChoices):
+    USER = 'user', 'Customer'
+    AGENT = 'agent', 'Support Agent'
+    SYSTEM = 'system', 'System'
+
@@ -0,0 +1,23 @@
+# Generated by Django 6.0.1 on 2026-10-16 10:00
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('caredesk', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='satisfactionsurvey',
+            name='rating',
+            field=models.PositiveSmallIntegerField(help_text='Rating from 1-5', validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(5)]),
+        ),
+        migrations.AddConstraint(
+            model_name='satisfactionsurvey',
+            constraint=models.CheckConstraint(condition=models.Q(('rating__gte', 1), ('rating__lte', 5)), name='caredesk_survey_rating_1_5'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 6.0.1 on 2026-10-16 10:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('caredesk', '0002_satisfactionsurvey_rating_check'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['user_id', 'status'], name='idx_ticket_user_status'),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['reference_type', 'reference_id'], name='idx_ticket_ref'),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['assigned_agent_id', 'status'], name='idx_ticket_agent_status'),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['-created_at'], name='idx_ticket_created'),
+        ),
+    ]
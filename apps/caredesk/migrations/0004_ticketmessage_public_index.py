@@ -0,0 +1,17 @@
+# Generated by Django 6.0.1 on 2026-10-16 10:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('caredesk', '0003_ticket_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ticketmessage',
+            index=models.Index(condition=models.Q(('is_internal', False)), fields=['ticket', 'created_at'], name='idx_ticket_msg_public'),
+        ),
+    ]
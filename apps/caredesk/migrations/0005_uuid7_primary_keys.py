@@ -0,0 +1,29 @@
+# Generated by Django 6.0.1 on 2026-10-16 10:20
+
+import apps.core.uuid7
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('caredesk', '0004_ticketmessage_public_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='ticket',
+            name='id',
+            field=models.UUIDField(default=apps.core.uuid7.uuid7, editable=False, primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='ticketmessage',
+            name='id',
+            field=models.UUIDField(default=apps.core.uuid7.uuid7, editable=False, primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='satisfactionsurvey',
+            name='id',
+            field=models.UUIDField(default=apps.core.uuid7.uuid7, editable=False, primary_key=True, serialize=False),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 6.0.1 on 2026-10-16 10:40
+
+from django.db import migrations
+from django.db.models import F
+
+
+def copy_completed_at(apps, schema_editor):
+    SatisfactionSurvey = apps.get_model('caredesk', 'SatisfactionSurvey')
+    SatisfactionSurvey.objects.update(created_at=F('completed_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('caredesk', '0005_uuid7_primary_keys'),
+    ]
+
+    operations = [
+        migrations.RunPython(copy_completed_at, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='satisfactionsurvey',
+            name='completed_at',
+        ),
+    ]
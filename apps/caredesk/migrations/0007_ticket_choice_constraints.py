@@ -0,0 +1,29 @@
+# Generated by Django 6.0.1 on 2026-10-16 10:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('caredesk', '0006_remove_satisfactionsurvey_completed_at'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='ticket',
+            constraint=models.CheckConstraint(condition=models.Q(('status__in', ['open', 'in_progress', 'waiting_customer', 'waiting_internal', 'resolved', 'closed'])), name='caredesk_ticket_status_valid'),
+        ),
+        migrations.AddConstraint(
+            model_name='ticket',
+            constraint=models.CheckConstraint(condition=models.Q(('issue_type__in', ['order', 'delivery', 'payment', 'refund', 'product', 'account', 'general', 'complaint', 'feedback'])), name='caredesk_ticket_issue_type_valid'),
+        ),
+        migrations.AddConstraint(
+            model_name='ticket',
+            constraint=models.CheckConstraint(condition=models.Q(('priority__in', ['low', 'medium', 'high', 'urgent'])), name='caredesk_ticket_priority_valid'),
+        ),
+        migrations.AddConstraint(
+            model_name='ticket',
+            constraint=models.CheckConstraint(condition=models.Q(('reference_type__in', ['order', 'transaction', 'shipment', 'product', 'other']), ('reference_type__isnull', True), _connector='OR'), name='caredesk_ticket_reference_type_valid'),
+        ),
+    ]
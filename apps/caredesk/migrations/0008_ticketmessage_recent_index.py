@@ -0,0 +1,17 @@
+# Generated by Django 6.0.1 on 2026-10-16 11:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('caredesk', '0007_ticket_choice_constraints'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ticketmessage',
+            index=models.Index(fields=['ticket', '-created_at'], name='idx_ticket_msg_recent'),
+        ),
+    ]
@@ -5,60 +5,44 @@ Tables: Tickets, TicketMessages, SatisfactionSurveys
 Dependency: Links to all other DBs via ReferenceID and UserID
 """
 import uuid
+from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
 from apps.core.models import BaseModel
+from .choices import TicketStatus, IssueType, TicketPriority, ReferenceType, MessageSender
+
+
+class TicketQuerySet(models.QuerySet):
+    """
+    Ticket queries that avoid N+1 lookups on related rows.
+    """
+    
+    def with_thread(self):
+        """
+        Load each ticket's survey and messages up front.
+        
+        The one-to-one survey is JOINed (select_related); the reverse-FK
+        messages come from one batched IN query (prefetch_related). Listing
+        N tickets with their threads takes 2 queries instead of 2N+1.
+        """
+        return self.select_related('survey').prefetch_related(
+            models.Prefetch('messages', queryset=TicketMessage.objects.order_by('created_at'))
+        )
 
 
 class Ticket(BaseModel):
     """
     Support ticket - can reference orders, transactions, or other entities.
     """
-    STATUS_CHOICES = [
-        ('open', 'Open'),
-        ('in_progress', 'In Progress'),
-        ('waiting_customer', 'Waiting on Customer'),
-        ('waiting_internal', 'Waiting on Internal Team'),
-        ('resolved', 'Resolved'),
-        ('closed', 'Closed'),
-    ]
-    
-    ISSUE_TYPE_CHOICES = [
-        ('order', 'Order Issue'),
-        ('delivery', 'Delivery Issue'),
-        ('payment', 'Payment Issue'),
-        ('refund', 'Refund Request'),
-        ('product', 'Product Issue'),
-        ('account', 'Account Issue'),
-        ('general', 'General Inquiry'),
-        ('complaint', 'Complaint'),
-        ('feedback', 'Feedback'),
-    ]
-    
-    PRIORITY_CHOICES = [
-        ('low', 'Low'),
-        ('medium', 'Medium'),
-        ('high', 'High'),
-        ('urgent', 'Urgent'),
-    ]
-    
-    REFERENCE_TYPE_CHOICES = [
-        ('order', 'Order'),
-        ('transaction', 'Transaction'),
-        ('shipment', 'Shipment'),
-        ('product', 'Product'),
-        ('other', 'Other'),
-    ]
-    
     # Foreign key to ShopCore User
     user_id = models.UUIDField(help_text="Reference to ShopCore User")
     
     # Flexible reference to any entity (Order, Transaction, etc.)
     reference_id = models.UUIDField(blank=True, null=True, help_text="Reference to related entity (Order, Transaction, etc.)")
-    reference_type = models.CharField(max_length=20, choices=REFERENCE_TYPE_CHOICES, blank=True, null=True)
+    reference_type = models.CharField(max_length=20, choices=ReferenceType.choices, blank=True, null=True)
     
-    issue_type = models.CharField(max_length=20, choices=ISSUE_TYPE_CHOICES, default='general')
-    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='open')
-    priority = models.CharField(max_length=10, choices=PRIORITY_CHOICES, default='medium')
+    issue_type = models.CharField(max_length=20, choices=IssueType.choices, default=IssueType.GENERAL)
+    status = models.CharField(max_length=20, choices=TicketStatus.choices, default=TicketStatus.OPEN)
+    priority = models.CharField(max_length=10, choices=TicketPriority.choices, default=TicketPriority.MEDIUM)
     
     subject = models.CharField(max_length=255)
     description = models.TextField()
@@ -71,11 +55,39 @@ class Ticket(BaseModel):
     first_response_at = models.DateTimeField(blank=True, null=True)
     resolved_at = models.DateTimeField(blank=True, null=True)
     
+    objects = TicketQuerySet.as_manager()
+    
     class Meta:
         db_table = 'caredesk_tickets'
         verbose_name = 'Ticket'
         verbose_name_plural = 'Tickets'
         ordering = ['-created_at']
+        # Cover the schema's common_queries predicates
+        indexes = [
+            models.Index(fields=['user_id', 'status'], name='idx_ticket_user_status'),
+            models.Index(fields=['reference_type', 'reference_id'], name='idx_ticket_ref'),
+            models.Index(fields=['assigned_agent_id', 'status'], name='idx_ticket_agent_status'),
+            models.Index(fields=['-created_at'], name='idx_ticket_created'),
+        ]
+        # Reject values outside the enums at insert time, bulk paths included
+        constraints = [
+            models.CheckConstraint(
+                condition=models.Q(status__in=TicketStatus.values),
+                name='caredesk_ticket_status_valid',
+            ),
+            models.CheckConstraint(
+                condition=models.Q(issue_type__in=IssueType.values),
+                name='caredesk_ticket_issue_type_valid',
+            ),
+            models.CheckConstraint(
+                condition=models.Q(priority__in=TicketPriority.values),
+                name='caredesk_ticket_priority_valid',
+            ),
+            models.CheckConstraint(
+                condition=models.Q(reference_type__in=ReferenceType.values) | models.Q(reference_type__isnull=True),
+                name='caredesk_ticket_reference_type_valid',
+            ),
+        ]
     
     def __str__(self):
         return f"Ticket {self.id} - {self.subject[:50]}"
@@ -85,14 +97,8 @@ class TicketMessage(BaseModel):
     """
     Individual messages/replies within a ticket thread.
     """
-    SENDER_CHOICES = [
-        ('user', 'Customer'),
-        ('agent', 'Support Agent'),
-        ('system', 'System'),
-    ]
-    
     ticket = models.ForeignKey(Ticket, on_delete=models.CASCADE, related_name='messages')
-    sender = models.CharField(max_length=10, choices=SENDER_CHOICES)
+    sender = models.CharField(max_length=10, choices=MessageSender.choices)
     sender_name = models.CharField(max_length=255, blank=True, null=True)
     content = models.TextField()
     is_internal = models.BooleanField(default=False, help_text="Internal notes not visible to customer")
@@ -102,6 +108,16 @@ class TicketMessage(BaseModel):
         verbose_name = 'Ticket Message'
         verbose_name_plural = 'Ticket Messages'
         ordering = ['created_at']
+        indexes = [
+            # Customer-visible thread: one range scan, already in created_at order
+            models.Index(
+                fields=['ticket', 'created_at'],
+                condition=models.Q(is_internal=False),
+                name='idx_ticket_msg_public',
+            ),
+            # Latest messages of a ticket, internal notes included
+            models.Index(fields=['ticket', '-created_at'], name='idx_ticket_msg_recent'),
+        ]
     
     def __str__(self):
         return f"Message from {self.sender} on Ticket {self.ticket_id}"
@@ -110,23 +126,27 @@ class TicketMessage(BaseModel):
 class SatisfactionSurvey(BaseModel):
     """
     Customer satisfaction survey after ticket resolution.
+    created_at is the completion time.
     """
     ticket = models.OneToOneField(Ticket, on_delete=models.CASCADE, related_name='survey')
-    rating = models.PositiveSmallIntegerField(help_text="Rating from 1-5")
+    rating = models.PositiveSmallIntegerField(
+        validators=[MinValueValidator(1), MaxValueValidator(5)],
+        help_text="Rating from 1-5"
+    )
     comments = models.TextField(blank=True, null=True)
     would_recommend = models.BooleanField(blank=True, null=True)
-    completed_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
         db_table = 'caredesk_satisfaction_surveys'
         verbose_name = 'Satisfaction Survey'
         verbose_name_plural = 'Satisfaction Surveys'
+        # Enforced in the DB so bulk_create/bulk_update stay valid too
+        constraints = [
+            models.CheckConstraint(
+                condition=models.Q(rating__gte=1, rating__lte=5),
+                name='caredesk_survey_rating_1_5',
+            ),
+        ]
     
     def __str__(self):
         return f"Survey for Ticket {self.ticket_id} - Rating: {self.rating}/5"
-    
-    def save(self, *args, **kwargs):
-        # Validate rating is 1-5
-        if self.rating < 1 or self.rating > 5:
-            raise ValueError("Rating must be between 1 and 5")
-        super().save(*args, **kwargs)
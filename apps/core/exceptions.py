@@ -1,60 +1,93 @@
 """
 Custom exceptions for OmniLife Multi-Agent Orchestrator
+
+Messages are formatted lazily in __str__/message: most of these are raised,
+caught and logged at most once, so the full text is only built when needed.
+Attributes live in __slots__, so no per-instance __dict__ is materialized.
 """
+from .utils import truncate_for_display
+
+# Cap on the SQL text kept on SQLExecutionException
+SQL_DISPLAY_LIMIT = 500
 
 
 class OmniLifeException(Exception):
     """Base exception for all OmniLife errors"""
+    __slots__ = ('_message', 'code')
+    
     def __init__(self, message: str, code: str = "OMNILIFE_ERROR"):
-        self.message = message
+        self._message = message
         self.code = code
-        super().__init__(self.message)
+        super().__init__(message)
+    
+    @property
+    def message(self) -> str:
+        return self._format_message()
+    
+    def _format_message(self) -> str:
+        return self._message
+    
+    def __str__(self):
+        return self._format_message()
 
 
 class AgentException(OmniLifeException):
     """Exception raised by agents during execution"""
+    __slots__ = ('agent_name',)
+    
     def __init__(self, agent_name: str, message: str):
         self.agent_name = agent_name
-        super().__init__(
-            message=f"[{agent_name}] {message}",
-            code="AGENT_ERROR"
-        )
+        super().__init__(message=message, code="AGENT_ERROR")
+    
+    def _format_message(self) -> str:
+        return f"[{self.agent_name}] {self._detail()}"
+    
+    def _detail(self) -> str:
+        return self._message
 
 
 class SQLGenerationException(AgentException):
     """Exception raised when SQL generation fails"""
+    __slots__ = ('query', 'reason')
+    
     def __init__(self, agent_name: str, query: str, reason: str):
         self.query = query
         self.reason = reason
-        super().__init__(
-            agent_name=agent_name,
-            message=f"Failed to generate SQL for query '{query}': {reason}"
-        )
+        super().__init__(agent_name=agent_name, message=reason)
+    
+    def _detail(self) -> str:
+        return f"Failed to generate SQL for query {self.query!r}: {self.reason}"
 
 
 class SQLExecutionException(AgentException):
     """Exception raised when SQL execution fails"""
+    __slots__ = ('sql', 'error')
+    
     def __init__(self, agent_name: str, sql: str, error: str):
-        self.sql = sql
+        self.sql = truncate_for_display(sql, SQL_DISPLAY_LIMIT)
         self.error = error
-        super().__init__(
-            agent_name=agent_name,
-            message=f"SQL execution failed: {error}"
-        )
+        super().__init__(agent_name=agent_name, message=error)
+    
+    def _detail(self) -> str:
+        return f"SQL execution failed: {self.error}"
 
 
 class OrchestratorException(OmniLifeException):
     """Exception raised by the orchestrator"""
+    __slots__ = ('stage',)
+    
     def __init__(self, message: str, stage: str = "unknown"):
         self.stage = stage
-        super().__init__(
-            message=f"Orchestrator error at {stage}: {message}",
-            code="ORCHESTRATOR_ERROR"
-        )
+        super().__init__(message=message, code="ORCHESTRATOR_ERROR")
+    
+    def _format_message(self) -> str:
+        return f"Orchestrator error at {self.stage}: {self._message}"
 
 
 class DependencyResolutionException(OrchestratorException):
     """Exception raised when dependency resolution fails"""
+    __slots__ = ('missing_deps',)
+    
     def __init__(self, message: str, missing_deps: list = None):
         self.missing_deps = missing_deps or []
         super().__init__(message=message, stage="dependency_resolution")
@@ -62,16 +95,20 @@ class DependencyResolutionException(OrchestratorException):
 
 class LLMException(OmniLifeException):
     """Exception raised when LLM calls fail"""
+    __slots__ = ('model',)
+    
     def __init__(self, message: str, model: str = None):
         self.model = model
-        super().__init__(
-            message=f"LLM error: {message}",
-            code="LLM_ERROR"
-        )
+        super().__init__(message=message, code="LLM_ERROR")
+    
+    def _format_message(self) -> str:
+        return f"LLM error: {self._message}"
 
 
 class ValidationException(OmniLifeException):
     """Exception raised for validation errors"""
+    __slots__ = ('field',)
+    
     def __init__(self, message: str, field: str = None):
         self.field = field
         super().__init__(
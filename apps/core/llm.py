@@ -0,0 +1,118 @@
+"""
+Shared LLM client factory for OmniLife Multi-Agent Orchestrator
+"""
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from typing import AsyncIterator, Dict, Optional, Tuple
+
+import httpx
+from django.conf import settings
+from langchain_openai import ChatOpenAI
+
+logger = logging.getLogger(__name__)
+
+
+HTTP_TIMEOUT = httpx.Timeout(60.0, connect=10.0)
+
+
+def _http_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=settings.LLM_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.LLM_MAX_KEEPALIVE_CONNECTIONS,
+    )
+
+
+@lru_cache(maxsize=1)
+def get_http_client() -> httpx.Client:
+    """
+    Process-wide HTTP connection pool for LLM calls.
+    Reusing it avoids a TLS handshake and a new pool per client.
+    """
+    return httpx.Client(timeout=HTTP_TIMEOUT, limits=_http_limits())
+
+
+def _build_llm(model: str, temperature: float, http_async_client: Optional[httpx.AsyncClient] = None) -> ChatOpenAI:
+    logger.info(f"Creating LLM client for {model} (temperature={temperature})")
+    return ChatOpenAI(
+        model=model,
+        api_key=settings.GITHUB_TOKEN,
+        base_url=settings.LLM_BASE_URL,
+        temperature=temperature,
+        http_client=get_http_client(),
+        http_async_client=http_async_client,
+    )
+
+
+@lru_cache(maxsize=None)
+def _process_llm(model: str, temperature: float) -> ChatOpenAI:
+    return _build_llm(model, temperature)
+
+
+def get_process_llm(model: str, temperature: float = 0) -> ChatOpenAI:
+    """
+    Get the process-wide ChatOpenAI instance for sync invoke() callers,
+    such as the agents. One instance per (model, temperature).
+    """
+    # Positional, so the lru_cache key does not depend on how it was called
+    return _process_llm(model, temperature)
+
+
+class _LoopLLMs:
+    """LLM clients sharing one async pool on one event loop."""
+    
+    def __init__(self):
+        self.users = 0
+        self.http_client = httpx.AsyncClient(timeout=HTTP_TIMEOUT, limits=_http_limits())
+        self.llms: Dict[Tuple[str, float], ChatOpenAI] = {}
+
+
+# httpx.AsyncClient connections belong to the loop that opened them, and
+# async_to_sync() runs each WSGI call on a new loop, so async pools are
+# per loop and closed once the last llm_scope() on that loop exits
+_loop_llms: Dict[asyncio.AbstractEventLoop, _LoopLLMs] = {}
+
+
+@asynccontextmanager
+async def llm_scope() -> AsyncIterator[None]:
+    """
+    Keep an async LLM pool open on the running loop for the enclosed work.
+    
+    Concurrent scopes on a long-lived (ASGI) loop share the pool; it is
+    closed with aclose() when the last of them exits, so a short-lived
+    loop does not leave connections (or itself) behind.
+    """
+    loop = asyncio.get_running_loop()
+    entry = _loop_llms.get(loop)
+    if entry is None:
+        entry = _loop_llms[loop] = _LoopLLMs()
+    entry.users += 1
+    try:
+        yield
+    finally:
+        entry.users -= 1
+        if entry.users == 0:
+            del _loop_llms[loop]
+            await entry.http_client.aclose()
+
+
+def get_llm(model: str, temperature: float = 0) -> ChatOpenAI:
+    """
+    Get a shared ChatOpenAI instance for the GitHub Models API.
+    
+    Inside llm_scope(), returns the running loop's instance, whose
+    ainvoke()/astream() use that loop's async pool; anywhere else, the
+    process-wide instance from get_process_llm().
+    """
+    try:
+        entry = _loop_llms.get(asyncio.get_running_loop())
+    except RuntimeError:
+        entry = None
+    if entry is None:
+        return get_process_llm(model, temperature)
+    
+    llm = entry.llms.get((model, temperature))
+    if llm is None:
+        llm = entry.llms[(model, temperature)] = _build_llm(model, temperature, entry.http_client)
+    return llm
@@ -1,15 +1,17 @@
 """
 Abstract base models for OmniLife applications
 """
-import uuid
 from django.db import models
 
+from .uuid7 import uuid7
+
 
 class BaseModel(models.Model):
     """
     Abstract base model with common fields for all entities.
+    IDs are UUIDv7 so new rows append to the end of the PK index.
     """
-    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
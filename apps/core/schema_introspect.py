@@ -0,0 +1,101 @@
+"""
+Build text-to-SQL schema descriptions from Django models
+
+Keeps column names, types, keys, nullability, indexes and choice values in
+the agent prompts in step with models.py. Only the prose (descriptions and
+cross-database references Django cannot see) is supplied by the caller.
+"""
+from typing import Dict, Iterable, Optional, Set
+
+from django.db import models
+from django.utils.text import capfirst
+
+# Django internal field type -> SQL type shown to the LLM
+_SQL_TYPES = {
+    'UUIDField': 'UUID',
+    'TextField': 'TEXT',
+    'DateTimeField': 'TIMESTAMP',
+    'DateField': 'DATE',
+    'BooleanField': 'BOOLEAN',
+    'IntegerField': 'INTEGER',
+    'SmallIntegerField': 'INTEGER',
+    'PositiveIntegerField': 'INTEGER',
+    'PositiveSmallIntegerField': 'INTEGER',
+    'BigIntegerField': 'BIGINT',
+    'FloatField': 'FLOAT',
+    'JSONField': 'JSON',
+}
+
+
+def _sql_type(field: models.Field) -> str:
+    if field.is_relation:
+        return _sql_type(field.target_field)
+    internal_type = field.get_internal_type()
+    if internal_type in ('CharField', 'EmailField', 'SlugField', 'URLField'):
+        return f"VARCHAR({field.max_length})"
+    if internal_type == 'DecimalField':
+        return f"DECIMAL({field.max_digits},{field.decimal_places})"
+    return _SQL_TYPES.get(internal_type, internal_type.replace('Field', '').upper())
+
+
+def _indexed_columns(model) -> Set[str]:
+    """Columns that lead an index, i.e. can be filtered on cheaply by themselves."""
+    indexed = set()
+    for index in model._meta.indexes:
+        leading = index.fields[0].lstrip('-')
+        indexed.add(model._meta.get_field(leading).column)
+    for field in model._meta.concrete_fields:
+        if field.db_index and not field.is_relation:
+            indexed.add(field.column)
+    return indexed
+
+
+def _column_from_field(field: models.Field, indexed: Set[str], notes: Dict) -> Dict:
+    column = {"name": field.column, "type": _sql_type(field)}
+    if field.primary_key:
+        column["primary_key"] = True
+    if field.is_relation:
+        column["foreign_key"] = f"{field.related_model._meta.db_table}.{field.target_field.column}"
+    if field.unique and not field.primary_key:
+        column["unique"] = True
+    if field.null:
+        column["nullable"] = True
+    if field.column in indexed:
+        column["indexed"] = True
+    
+    description = notes.pop("description", None) or field.help_text or capfirst(field.verbose_name)
+    if field.choices:
+        column["choices"] = [str(value) for value, _ in field.flatchoices]
+        description = f"{description}. One of: {', '.join(column['choices'])}"
+    column["description"] = str(description)
+    
+    column.update(notes)
+    return column
+
+
+def table_from_model(model, description: Optional[str] = None, columns: Optional[Dict[str, Dict]] = None) -> Dict:
+    """
+    Describe one model's table. `columns` maps a column name to extra keys
+    (e.g. description, foreign_key) that override what introspection found.
+    """
+    columns = columns or {}
+    indexed = _indexed_columns(model)
+    return {
+        "name": model._meta.db_table,
+        "description": description or (model.__doc__ or "").strip(),
+        "columns": [
+            _column_from_field(field, indexed, dict(columns.get(field.column, {})))
+            for field in model._meta.concrete_fields
+        ],
+    }
+
+
+def build_schema(db_name: str, description: str, tables: Iterable[Dict], **extra) -> Dict:
+    """Assemble a schema dict in the shape the agents' get_schema_prompt() expects."""
+    schema = {
+        "database": db_name,
+        "description": description,
+        "tables": list(tables),
+    }
+    schema.update(extra)
+    return schema
@@ -4,65 +4,241 @@ Utility functions for OmniLife Multi-Agent Orchestrator
 import re
 import json
 import logging
-from typing import Any, Dict, List, Optional
-from datetime import datetime
+from collections import deque
+from dataclasses import is_dataclass
+from decimal import Decimal
+from enum import Enum
+from functools import lru_cache
+from typing import Any, Callable, Deque, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+from datetime import datetime, date, time
+from time import perf_counter_ns, time_ns
+from uuid import UUID
+
+import orjson
 
 logger = logging.getLogger(__name__)
 
+# Precompiled patterns for the LLM response path
+_COMMENT_LINE_RE = re.compile(r'--.*$', re.MULTILINE)
+_COMMENT_BLOCK_RE = re.compile(r'/\*.*?\*/', re.DOTALL)
+_JSON_FENCE_RE = re.compile(r'```(?:json)?\s*([\s\S]*?)```')
+_JSON_OBJ_RE = re.compile(r'\{[\s\S]*\}')
+_JSON_ARR_RE = re.compile(r'\[[\s\S]*\]')
+_THINK_BLOCK_RE = re.compile(r'<think>[\s\S]*?</think>')
+# Accepts raw newlines/tabs inside strings, which models emit and orjson rejects
+_LENIENT_JSON = json.JSONDecoder(strict=False)
+# Whole-word match so identifiers like updated_at don't trip the check
+_DANGEROUS_SQL_RE = re.compile(
+    r'\b(?:DROP|DELETE|TRUNCATE|ALTER|INSERT|UPDATE|GRANT|REVOKE)\b',
+    re.IGNORECASE
+)
+
 
+@lru_cache(maxsize=1024)
 def sanitize_sql(sql: str) -> str:
     """
     Basic SQL sanitization to prevent dangerous operations.
     This is a safety layer - the ORM should be used when possible.
+    Memoized; rejected SQL raises and is not cached.
     """
     # Remove comments
-    sql = re.sub(r'--.*$', '', sql, flags=re.MULTILINE)
-    sql = re.sub(r'/\*.*?\*/', '', sql, flags=re.DOTALL)
+    sql = _COMMENT_LINE_RE.sub('', sql)
+    sql = _COMMENT_BLOCK_RE.sub('', sql)
     
     # Check for dangerous keywords
-    dangerous_keywords = ['DROP', 'DELETE', 'TRUNCATE', 'ALTER', 'INSERT', 'UPDATE', 'GRANT', 'REVOKE']
-    sql_upper = sql.upper()
-    
-    for keyword in dangerous_keywords:
-        if keyword in sql_upper:
-            raise ValueError(f"Dangerous SQL keyword '{keyword}' detected")
+    match = _DANGEROUS_SQL_RE.search(sql)
+    if match:
+        raise ValueError(f"Dangerous SQL keyword '{match.group(0).upper()}' detected")
     
     return sql.strip()
 
 
+def _loads_json(text: str) -> Any:
+    """
+    Parse with orjson, retrying with the stdlib decoder in non-strict mode.
+    Both raise ValueError subclasses on malformed input.
+    """
+    try:
+        return orjson.loads(text)
+    except orjson.JSONDecodeError:
+        return _LENIENT_JSON.decode(text)
+
+
 def extract_json_from_response(response: str) -> Optional[Dict]:
     """
     Extract JSON from an LLM response that may contain markdown code blocks.
+    Each call returns a freshly parsed object, so callers may mutate it.
     """
-    # Try to find JSON in code blocks
-    json_match = re.search(r'```(?:json)?\s*([\s\S]*?)```', response)
-    if json_match:
+    for text in _json_candidates(response):
         try:
-            return json.loads(json_match.group(1))
-        except json.JSONDecodeError:
-            pass
+            return _loads_json(text)
+        except ValueError:
+            continue
+    return None
+
+
+@lru_cache(maxsize=1024)
+def _json_candidates(response: str) -> Tuple[str, ...]:
+    """
+    The parts of a response that may hold its JSON, most likely first.
+    Located by cheap scans only; extract_json_from_response parses each
+    once, in order, until one succeeds. Memoized on the raw response, so
+    repeats skip the scans; no parsed (mutable) object is cached.
+    """
+    # Drop reasoning-model <think> blocks so the parsers never scan them
+    if '<think>' in response:
+        response = _THINK_BLOCK_RE.sub('', response)
+    text = response.strip()
+    candidates = []
     
-    # Try to parse the entire response as JSON
-    try:
-        return json.loads(response)
-    except json.JSONDecodeError:
-        pass
+    # The response is already bare JSON
+    if text[:1] in ('{', '['):
+        candidates.append(text)
+    
+    # JSON in a code block
+    if '```' in text:
+        json_match = _JSON_FENCE_RE.search(text)
+        if json_match:
+            candidates.append(json_match.group(1))
+    
+    # A JSON object or array somewhere in the text
+    for pattern in (_JSON_OBJ_RE, _JSON_ARR_RE):
+        match = pattern.search(text)
+        if match and match.group() not in candidates:
+            candidates.append(match.group())
+    
+    return tuple(candidates)
+
+
+# Converters for DB values that are not JSON primitives, dispatched by exact type
+_VALUE_CONVERTERS: Dict[type, Callable[[Any], Any]] = {
+    datetime: datetime.isoformat,
+    date: date.isoformat,
+    time: time.isoformat,
+    Decimal: str,
+    UUID: str,
+    bytes: bytes.hex,
+}
+
+
+# Values orjson encodes as they are; other types without a converter are
+# formatted with isoformat() or str() (timedelta, IP addresses, ...)
+_JSON_NATIVE_TYPES = frozenset({str, int, float, bool, type(None), list, dict})
+
+
+def _fallback_json_value(value: Any) -> Any:
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return str(value)
+
+
+def to_json_value(value: Any) -> Any:
+    """Convert a single DB value to a JSON-friendly primitive."""
+    value_type = type(value)
+    converter = _VALUE_CONVERTERS.get(value_type)
+    if converter:
+        return converter(value)
+    if value_type in _JSON_NATIVE_TYPES:
+        return value
+    return _fallback_json_value(value)
+
+
+def normalize_for_json(value: Any) -> Any:
+    """
+    Recursively convert a payload to JSON primitives in one pass.
+    Dispatches on exact type first; Enum members collapse to their value,
+    dataclasses are left to orjson and anything else unknown is str()'d.
+    """
+    value_type = type(value)
+    if value_type in (str, int, float, bool) or value is None:
+        return value
+    if isinstance(value, dict):
+        return {key: normalize_for_json(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [normalize_for_json(item) for item in value]
+    converter = _VALUE_CONVERTERS.get(value_type)
+    if converter:
+        return converter(value)
+    if isinstance(value, Enum):
+        return value.value
+    if is_dataclass(value):
+        return value
+    return _fallback_json_value(value)
+
+
+def _cell_expression(i: int, value_type: type, namespace: Dict[str, Any]) -> str:
+    """
+    Source for converting cell i, specialized for the sampled type: cells of
+    that type take the fast branch, any other type goes through
+    to_json_value (a NULL first row, an int column that later holds a
+    Decimal, ...).
+    """
+    converter = _VALUE_CONVERTERS.get(value_type)
+    if converter is not None:
+        namespace[f"_c{i}"] = converter
+        namespace[f"_t{i}"] = value_type
+        return f"(_c{i}(v) if type(v := row[{i}]) is _t{i} else _cv(v))"
+    if value_type in _JSON_NATIVE_TYPES and value_type is not type(None):
+        namespace[f"_t{i}"] = value_type
+        return f"(v if type(v := row[{i}]) is _t{i} else _cv(v))"
+    return f"_cv(row[{i}])"
+
+
+@lru_cache(maxsize=256)
+def _row_converter(columns: Tuple[str, ...], types: Tuple[type, ...]) -> Callable[[Sequence[Any]], Dict]:
+    """
+    Build a straight-line row -> dict function for one column/type signature.
     
-    # Try to find a JSON object or array in the text
-    patterns = [
-        r'\{[\s\S]*\}',  # Object
-        r'\[[\s\S]*\]',  # Array
+    The generated function indexes each cell directly and checks it against
+    the type sampled from the first row, e.g.
+        def convert(row): return {'id': (_c0(v) if type(v := row[0]) is _t0 else _cv(v)), ...}
+    """
+    namespace = {"_cv": to_json_value}
+    items = [
+        f"{col!r}: {_cell_expression(i, value_type, namespace)}"
+        for i, (col, value_type) in enumerate(zip(columns, types))
     ]
     
-    for pattern in patterns:
-        match = re.search(pattern, response)
-        if match:
-            try:
-                return json.loads(match.group())
-            except json.JSONDecodeError:
-                continue
+    source = "def convert(row):\n    return {" + ", ".join(items) + "}\n"
+    exec(source, namespace)
+    return namespace["convert"]
+
+
+def iter_cursor_rows(cursor, batch_size: int = 1000) -> Iterator[Sequence[Any]]:
+    """Yield rows from a DB cursor in fetchmany() batches instead of fetchall()."""
+    while True:
+        batch = cursor.fetchmany(batch_size)
+        if not batch:
+            return
+        yield from batch
+
+
+def rows_to_dicts(columns: Sequence[str], rows: Iterable[Sequence[Any]]) -> List[Dict]:
+    """
+    Convert raw cursor rows into JSON-friendly dicts.
     
-    return None
+    The row converter is specialized (and cached) for the column names and
+    the first row's value types, so each cell costs one exact type check;
+    cells of another type are converted individually. Accepts any
+    iterable, so rows can be streamed from iter_cursor_rows().
+    """
+    rows = iter(rows)
+    first = next(rows, None)
+    if first is None:
+        return []
+    
+    convert = _row_converter(tuple(columns), tuple(map(type, first)))
+    results = [convert(first)]
+    results.extend(map(convert, rows))
+    return results
+
+
+def elapsed_ms(start_ns: int) -> float:
+    """
+    Milliseconds since a time.perf_counter_ns() reading. The counter is
+    monotonic, so use it for durations; wall-clock time is for timestamps.
+    """
+    return (perf_counter_ns() - start_ns) / 1_000_000
 
 
 def format_agent_result(
@@ -81,26 +257,36 @@ def format_agent_result(
         "data": data,
         "sql_query": sql_query,
         "error": error,
-        "timestamp": datetime.utcnow().isoformat()
+        # Integer ns since the epoch (UTC); format at the edge if needed
+        "timestamp_ns": time_ns()
     }
 
 
-def build_schema_context(tables: List[Dict]) -> str:
-    """
-    Build a schema context string for LLM prompts.
-    """
+def _schema_fingerprint(tables: List[Dict]) -> Tuple:
+    """Hashable view of exactly the table/column fields build_schema_context renders."""
+    return tuple(
+        (
+            table.get("name", "Unknown"),
+            tuple(
+                (col['name'], col['type'], bool(col.get('primary_key')), col.get('foreign_key'))
+                for col in table.get("columns", [])
+            ),
+        )
+        for table in tables
+    )
+
+
+@lru_cache(maxsize=32)
+def _build_schema_context(fingerprint: Tuple) -> str:
     lines = ["Database Schema:"]
-    for table in tables:
-        table_name = table.get("name", "Unknown")
-        columns = table.get("columns", [])
-        
+    for table_name, columns in fingerprint:
         column_defs = []
-        for col in columns:
-            col_def = f"{col['name']} ({col['type']})"
-            if col.get('primary_key'):
+        for name, col_type, primary_key, foreign_key in columns:
+            col_def = f"{name} ({col_type})"
+            if primary_key:
                 col_def += " [PK]"
-            if col.get('foreign_key'):
-                col_def += f" [FK -> {col['foreign_key']}]"
+            if foreign_key:
+                col_def += f" [FK -> {foreign_key}]"
             column_defs.append(col_def)
         
         lines.append(f"\nTable: {table_name}")
@@ -109,6 +295,27 @@ def build_schema_context(tables: List[Dict]) -> str:
     return '\n'.join(lines)
 
 
+def build_schema_context(tables: List[Dict]) -> str:
+    """
+    Build a schema context string for LLM prompts.
+    Cached on a fingerprint of the rendered fields, so repeated calls with
+    the same schema skip the string building.
+    """
+    return _build_schema_context(_schema_fingerprint(tables))
+
+
+# Number of prior queries carried into an agent's user context
+RECENT_QUERY_LIMIT = 5
+
+
+def recent_queries_buffer(queries: Iterable[str] = ()) -> Deque[str]:
+    """
+    Bounded buffer for session_data["queries"]. Appends evict the oldest
+    entry in O(1), so the session never holds more than it will use.
+    """
+    return deque(queries, maxlen=RECENT_QUERY_LIMIT)
+
+
 def parse_user_context(user_id: Optional[str], session_data: Optional[Dict]) -> Dict:
     """
     Parse user context for enriching agent queries.
@@ -120,17 +327,27 @@ def parse_user_context(user_id: Optional[str], session_data: Optional[Dict]) ->
     
     if session_data:
         context.update({
-            "previous_queries": session_data.get("queries", [])[-5:],  # Last 5 queries
+            "previous_queries": _recent_queries(session_data.get("queries", ())),
             "known_entities": session_data.get("entities", {}),
         })
     
     return context
 
 
-def truncate_for_display(text: str, max_length: int = 100) -> str:
+def _recent_queries(queries: Iterable[str]) -> List[str]:
+    """Last RECENT_QUERY_LIMIT queries, without copying a long history first."""
+    if isinstance(queries, (list, tuple)):
+        return list(queries[-RECENT_QUERY_LIMIT:])
+    # deque (possibly already bounded by recent_queries_buffer) or any iterable
+    return list(deque(queries, maxlen=RECENT_QUERY_LIMIT))
+
+
+def truncate_for_display(text: Union[str, bytes], max_length: int = 100) -> Union[str, bytes]:
     """
-    Truncate text for display purposes.
+    Truncate text for display purposes. Short input is returned as-is.
     """
     if len(text) <= max_length:
         return text
-    return text[:max_length - 3] + "..."
+    if isinstance(text, bytes):
+        return text[:max_length - 3] + b"..."
+    return f"{text[:max_length - 3]}..."
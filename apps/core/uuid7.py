@@ -0,0 +1,24 @@
+"""
+Time-ordered UUIDs (UUIDv7, RFC 9562) for primary keys
+"""
+import os
+import time
+import uuid
+
+
+def uuid7() -> uuid.UUID:
+    """
+    Generate a UUIDv7: 48-bit Unix ms timestamp followed by random bits.
+    
+    Keys generated later sort later, so PK inserts land at the tail of the
+    B-tree index instead of on random leaf pages as uuid4 does.
+    """
+    timestamp_ms = time.time_ns() // 1_000_000
+    rand = int.from_bytes(os.urandom(10), 'big')
+    
+    value = (timestamp_ms & 0xFFFF_FFFF_FFFF) << 80
+    value |= 0x7 << 76                                   # version
+    value |= ((rand >> 62) & 0xFFF) << 64                # rand_a (12 bits)
+    value |= 0b10 << 62                                  # RFC 4122 variant
+    value |= rand & 0x3FFF_FFFF_FFFF_FFFF                # rand_b (62 bits)
+    return uuid.UUID(int=value)
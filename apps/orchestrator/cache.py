@@ -7,17 +7,40 @@ This module implements:
 3. Smart ORM fallback pattern matching
 4. Query decomposition for multi-intent handling
 """
-import hashlib
 import re
+import threading
+import time
 import logging
+from collections import OrderedDict
 from functools import lru_cache
 from typing import Dict, List, Tuple, Optional, Any
-from dataclasses import dataclass, field
+from dataclasses import dataclass, field, replace
 from enum import Enum
-from datetime import datetime, timedelta
+from datetime import datetime
+
+from apps.core.exceptions import DependencyResolutionException
 
 logger = logging.getLogger(__name__)
 
+# Filler words dropped from cache keys, matched as whole words
+_STOPWORD_RE = re.compile(r"\b(?:please|can|you|tell|me|show|the|a|an)\b")
+_WS_RE = re.compile(r"\s+")
+# Cache-key normalization: "where's" -> "where is", punctuation dropped,
+# and ID-shaped tokens templated: UUIDs, ORD-12345 / tracking-number style
+# codes and 8+ character hex/digit runs. Plain numbers ("1499") and model
+# names ("ps5") are part of the wording and stay in the key.
+_APOSTROPHE_S_RE = re.compile(r"['\u2019]s\b")
+_PUNCT_RE = re.compile(r"[^\w\s-]")
+_ID_TOKEN_RE = re.compile(
+    r"(?<![\w-])(?:"
+    r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}"
+    r"|[a-z]{2,4}-?\d{5,}"
+    r"|(?=[a-f0-9-]*\d)[a-f0-9][a-f0-9-]{7,}"
+    r")(?![\w-])",
+    re.IGNORECASE,
+)
+_ID_PLACEHOLDER = "<id>"
+
 
 class QueryPattern(str, Enum):
     """Common query patterns that can be handled by ORM directly."""
@@ -43,11 +66,17 @@ class CachedIntent:
     entities: List[Dict]
     required_agents: List[str]
     pattern: QueryPattern
-    timestamp: datetime
+    timestamp: datetime  # Wall-clock creation time, for debugging/stats only
     ttl_seconds: int = 3600  # 1 hour default
+    expires_at: float = field(default=0.0, repr=False)  # time.monotonic() deadline
+    id_values: Tuple[str, ...] = ()  # The templated IDs of the query that was cached
+    
+    def __post_init__(self):
+        if not self.expires_at:
+            self.expires_at = time.monotonic() + self.ttl_seconds
     
     def is_expired(self) -> bool:
-        return datetime.utcnow() - self.timestamp > timedelta(seconds=self.ttl_seconds)
+        return time.monotonic() > self.expires_at
 
 
 @dataclass
@@ -64,12 +93,14 @@ class QueryPatternMatcher:
     Matches ~60% of common queries without LLM call.
     """
     
-    # Regex patterns for common query types
+    # Regex patterns for common query types. Gaps are bounded lazy repeats
+    # ({0,40}?) rather than .* so long inputs can't trigger quadratic
+    # backtracking; chat queries are short enough that recall is unchanged.
     PATTERNS = {
         QueryPattern.ORDER_BY_PRODUCT: [
-            r"order.*(?:for|of|about)\s+['\"]?(\w+[\w\s]*)['\"]?",
-            r"(?:where|status).*order.*['\"]?(\w+[\w\s]*)['\"]?",
-            r"['\"]?(\w+[\w\s]*)['\"]?\s*order",
+            r"order.{0,40}?(?:for|of|about)\s+['\"]?(\w[\w\s]*)['\"]?",
+            r"(?:where|status).{0,40}?order.{0,40}?['\"]?(\w[\w\s]*)['\"]?",
+            r"['\"]?(\w[\w\s]{0,40}?)['\"]?\s*order",
         ],
         QueryPattern.ORDER_BY_ID: [
             r"order\s*(?:id|#|number)?\s*[:\s]?\s*([a-f0-9-]{8,})",
@@ -85,13 +116,13 @@ class QueryPatternMatcher:
             r"orders?\s*(?:from|in)\s*(?:last|past)\s*(?:week|month|day)",
         ],
         QueryPattern.TRACK_SHIPMENT: [
-            r"(?:track|where|status).*(?:shipment|package|delivery)",
-            r"(?:shipment|package|delivery).*(?:status|location|where)",
+            r"(?:track|where|status).{0,40}?(?:shipment|package|delivery)",
+            r"(?:shipment|package|delivery).{0,40}?(?:status|location|where)",
             r"where\s*is\s*(?:my)?\s*(?:order|package)",
         ],
         QueryPattern.SHIPMENT_BY_ORDER: [
-            r"(?:shipment|delivery|tracking).*order",
-            r"order.*(?:shipment|delivery|tracking)",
+            r"(?:shipment|delivery|tracking).{0,40}?order",
+            r"order.{0,40}?(?:shipment|delivery|tracking)",
         ],
         QueryPattern.USER_TRANSACTIONS: [
             r"(?:my|all|recent)?\s*transactions?",
@@ -100,7 +131,7 @@ class QueryPatternMatcher:
         ],
         QueryPattern.REFUND_STATUS: [
             r"refund\s*(?:status|processed|received)?",
-            r"(?:status|where).*refund",
+            r"(?:status|where).{0,40}?refund",
             r"(?:is|has)\s*(?:my)?\s*refund",
         ],
         QueryPattern.USER_TICKETS: [
@@ -109,8 +140,8 @@ class QueryPatternMatcher:
             r"(?:show|list)\s*(?:my)?\s*tickets?",
         ],
         QueryPattern.TICKET_BY_ORDER: [
-            r"ticket.*order",
-            r"order.*ticket",
+            r"ticket.{0,40}?order",
+            r"order.{0,40}?ticket",
         ],
         QueryPattern.WALLET_BALANCE: [
             r"(?:my|wallet)\s*balance",
@@ -118,6 +149,24 @@ class QueryPatternMatcher:
         ],
     }
     
+    # Literals at least one of which every regex in the bucket requires.
+    # A bucket is only searched when one appears in the lowercased query,
+    # a plain substring test that is far cheaper than the regex scan on
+    # the (majority) non-matching traffic. Keep in sync with PATTERNS.
+    REQUIRED_TERMS = {
+        QueryPattern.ORDER_BY_PRODUCT: ("order",),
+        QueryPattern.ORDER_BY_ID: ("order", "track"),
+        QueryPattern.USER_ORDERS: ("order",),
+        QueryPattern.RECENT_ORDERS: ("order",),
+        QueryPattern.TRACK_SHIPMENT: ("shipment", "package", "delivery", "order"),
+        QueryPattern.SHIPMENT_BY_ORDER: ("order",),
+        QueryPattern.USER_TRANSACTIONS: ("transaction", "history"),
+        QueryPattern.REFUND_STATUS: ("refund",),
+        QueryPattern.USER_TICKETS: ("ticket",),
+        QueryPattern.TICKET_BY_ORDER: ("ticket",),
+        QueryPattern.WALLET_BALANCE: ("balance", "wallet"),
+    }
+    
     # Entity extraction patterns
     ENTITY_PATTERNS = {
         "product_name": [
@@ -129,44 +178,51 @@ class QueryPatternMatcher:
             r"(?:order|id|#)\s*[:\s]?\s*([A-Z0-9-]{8,})",
         ],
         "tracking_number": [
-            r"(?:track|tracking).*?([A-Z]{2,4}[0-9]{8,})",
+            r"(?:track|tracking).{0,40}?([A-Z]{2,4}[0-9]{8,})",
         ],
         "amount": [
             r"\$?\s*(\d+(?:\.\d{2})?)",
         ],
     }
     
+    # Each bucket's regexes unioned into one compiled alternation, in
+    # PATTERNS order; IGNORECASE stays because some classes are [A-Z]
+    _COMPILED_PATTERNS: List[Tuple[QueryPattern, "re.Pattern"]] = [
+        (pattern_type, re.compile("|".join(f"(?:{regex})" for regex in regexes), re.IGNORECASE))
+        for pattern_type, regexes in PATTERNS.items()
+    ]
+    
+    # Entity regexes are compiled one by one (unioning would mix up their
+    # groups), with the group that holds the value: 1 if captured, else 0
+    _COMPILED_ENTITY_PATTERNS: List[Tuple[str, "re.Pattern", int]] = [
+        (entity_type, compiled, 1 if compiled.groups else 0)
+        for entity_type, patterns in ENTITY_PATTERNS.items()
+        for compiled in (re.compile(pattern, re.IGNORECASE) for pattern in patterns)
+    ]
+    
     @classmethod
     def match_pattern(cls, query: str) -> Tuple[QueryPattern, float]:
         """
         Match query against known patterns.
         Returns (pattern, confidence).
         """
-        query_lower = query.lower()
-        
-        for pattern_type, regexes in cls.PATTERNS.items():
-            for regex in regexes:
-                if re.search(regex, query_lower, re.IGNORECASE):
-                    return pattern_type, 0.85
-        
-        return QueryPattern.UNKNOWN, 0.0
+        return _match_pattern_cached(query.lower())
     
     @classmethod
     def extract_entities(cls, query: str) -> List[Dict]:
         """Extract entities from query using regex patterns."""
         entities = []
-        query_lower = query.lower()
+        append = entities.append
         
-        for entity_type, patterns in cls.ENTITY_PATTERNS.items():
-            for pattern in patterns:
-                matches = re.findall(pattern, query, re.IGNORECASE)
-                for match in matches:
-                    if len(match) > 2:  # Filter noise
-                        entities.append({
-                            "type": entity_type,
-                            "value": match.strip(),
-                            "confidence": 0.8
-                        })
+        for entity_type, compiled, group in cls._COMPILED_ENTITY_PATTERNS:
+            for match in compiled.finditer(query):
+                # Filter noise before materializing the matched text
+                if match.end(group) - match.start(group) > 2:
+                    append({
+                        "type": entity_type,
+                        "value": match.group(group).strip(),
+                        "confidence": 0.8
+                    })
         
         return entities
     
@@ -175,14 +231,31 @@ class QueryPatternMatcher:
         """
         Determine if query can be handled with ORM (no LLM needed).
         Returns (can_handle, pattern, entities).
+        Entities are only extracted on a match; on a miss the list is empty,
+        so callers that need them must call extract_entities() themselves.
         """
         pattern, confidence = cls.match_pattern(query)
-        entities = cls.extract_entities(query)
+        if pattern == QueryPattern.UNKNOWN or confidence < 0.7:
+            return False, QueryPattern.UNKNOWN, []
         
-        if pattern != QueryPattern.UNKNOWN and confidence >= 0.7:
-            return True, pattern, entities
-        
-        return False, QueryPattern.UNKNOWN, entities
+        return True, pattern, cls.extract_entities(query)
+
+
+@lru_cache(maxsize=1024)
+def _match_pattern_cached(query_lower: str) -> Tuple[QueryPattern, float]:
+    """
+    Pattern bank scan behind QueryPatternMatcher.match_pattern, memoized so
+    retried/reloaded queries skip the regexes. Entities depend on the
+    original casing and are not cached.
+    """
+    required_terms = QueryPatternMatcher.REQUIRED_TERMS
+    for pattern_type, compiled in QueryPatternMatcher._COMPILED_PATTERNS:
+        # Bucket order is match priority, so it is kept; the literal check
+        # only skips buckets that cannot match
+        if any(term in query_lower for term in required_terms[pattern_type]) and compiled.search(query_lower):
+            return pattern_type, 0.85
+    
+    return QueryPattern.UNKNOWN, 0.0
 
 
 class IntentCache:
@@ -191,57 +264,81 @@ class IntentCache:
     Reduces redundant LLM calls for similar queries.
     """
     
+    # Below this many characters a query is its own cache key
+    SHORT_QUERY_LENGTH = 20
+    
     def __init__(self, max_size: int = 100, ttl_seconds: int = 3600):
-        self._cache: Dict[str, CachedIntent] = {}
+        # Ordered oldest -> most recently used
+        self._cache: "OrderedDict[str, CachedIntent]" = OrderedDict()
+        # fast_path is a sync node, run in executor threads across requests
+        self._lock = threading.Lock()
         self._max_size = max_size
         self._ttl_seconds = ttl_seconds
         self._hits = 0
         self._misses = 0
     
     def _hash_query(self, query: str) -> str:
-        """Create hash of normalized query."""
-        normalized = query.lower().strip()
-        # Remove common words for better matching
-        for word in ["please", "can", "you", "tell", "me", "show", "the", "a", "an"]:
-            normalized = normalized.replace(word, "")
-        normalized = " ".join(normalized.split())
-        return hashlib.md5(normalized.encode()).hexdigest()[:16]
+        """
+        Normalized query used directly as the cache key (dict hashing is
+        enough in-process; no digest needed). See _intent_cache_key.
+        """
+        return _intent_cache_key(query)
     
     def get(self, query: str) -> Optional[CachedIntent]:
         """Get cached intent if exists and not expired."""
         key = self._hash_query(query)
         
-        if key in self._cache:
-            cached = self._cache[key]
-            if not cached.is_expired():
-                self._hits += 1
-                logger.debug(f"[CACHE HIT] Query: {query[:30]}...")
-                return cached
-            else:
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None and cached.is_expired():
                 del self._cache[key]
-        
-        self._misses += 1
-        return None
+            elif cached is not None:
+                if _ID_PLACEHOLDER not in key or (id_values := _id_values(query)) == cached.id_values:
+                    return self._hit(key, query, cached)
+                # Same wording, other IDs: pattern entries are rebuilt from
+                # this query; LLM entities are normalized values that can't
+                # be mapped onto the new IDs, so those entries only serve
+                # the IDs they were classified with
+                if cached.pattern != QueryPattern.UNKNOWN:
+                    return self._hit(key, query, replace(
+                        cached,
+                        entities=QueryPatternMatcher.extract_entities(query),
+                        id_values=id_values
+                    ))
+            
+            self._misses += 1
+            return None
+    
+    def _hit(self, key: str, query: str, cached: CachedIntent) -> CachedIntent:
+        """Record a hit on key and return the entry served for it (lock held)."""
+        self._cache.move_to_end(key)
+        self._hits += 1
+        logger.debug(f"[CACHE HIT] Query: {query[:30]}...")
+        return cached
     
     def set(self, query: str, intent: str, confidence: float, 
             entities: List[Dict], agents: List[str], pattern: QueryPattern):
         """Cache intent classification result."""
         key = self._hash_query(query)
         
-        # LRU eviction
-        if len(self._cache) >= self._max_size:
-            oldest_key = min(self._cache, key=lambda k: self._cache[k].timestamp)
-            del self._cache[oldest_key]
-        
-        self._cache[key] = CachedIntent(
+        entry = CachedIntent(
             intent=intent,
             confidence=confidence,
             entities=entities,
             required_agents=agents,
             pattern=pattern,
             timestamp=datetime.utcnow(),
-            ttl_seconds=self._ttl_seconds
+            ttl_seconds=self._ttl_seconds,
+            id_values=_id_values(query) if _ID_PLACEHOLDER in key else ()
         )
+        
+        with self._lock:
+            # LRU eviction by OrderedDict position; expiry uses expires_at
+            if key in self._cache:
+                self._cache.move_to_end(key)
+            elif len(self._cache) >= self._max_size:
+                self._cache.popitem(last=False)
+            self._cache[key] = entry
         logger.debug(f"[CACHE SET] Query: {query[:30]}...")
     
     def get_stats(self) -> Dict:
@@ -257,6 +354,34 @@ class IntentCache:
         }
 
 
+@lru_cache(maxsize=1024)
+def _intent_cache_key(query: str) -> str:
+    """
+    IntentCache key for a query, memoized: a query is looked up and then
+    stored (often from another graph node), and retries repeat it, so the
+    regex passes run once per distinct query.
+    
+    Short queries skip normalization and are keyed as typed (lowercased).
+    Longer ones drop punctuation and filler words and have their IDs
+    templated, so "Where's order ORD-12345?" and "where is order ORD-67890"
+    share a key.
+    """
+    query = query.lower().strip()
+    if len(query) < IntentCache.SHORT_QUERY_LENGTH:
+        return query
+    query = _PUNCT_RE.sub(" ", _APOSTROPHE_S_RE.sub(" is", query))
+    query = _ID_TOKEN_RE.sub(_ID_PLACEHOLDER, query)
+    return _WS_RE.sub(" ", _STOPWORD_RE.sub("", query)).strip()
+
+
+def _id_values(query: str) -> Tuple[str, ...]:
+    """
+    The IDs _intent_cache_key templates, as typed and in order; a templated
+    hit compares them to tell a repeat from the same wording with new IDs.
+    """
+    return tuple(_ID_TOKEN_RE.findall(_PUNCT_RE.sub(" ", _APOSTROPHE_S_RE.sub(" is", query))))
+
+
 class QueryDecomposer:
     """
     Decompose multi-intent queries into sub-queries.
@@ -275,46 +400,50 @@ class QueryDecomposer:
         "ticket_status": ["ticket", "support", "issue", "complaint", "help"],
     }
     
+    _KEYWORD_INTENTS = {kw: intent for intent, keywords in INTENT_KEYWORDS.items() for kw in keywords}
+    _CONJUNCTION_SET = frozenset(CONJUNCTIONS)
+    
+    # One pass over the query finds every conjunction/keyword occurrence,
+    # overlaps included (zero-width lookahead at each position). Shorter
+    # terms are tried first so "order" is still reported inside "ordered".
+    _SCAN_RE = re.compile(
+        "(?=(" + "|".join(re.escape(term) for term in sorted([*CONJUNCTIONS, *_KEYWORD_INTENTS], key=len)) + "))"
+    )
+    
+    @classmethod
+    def _scan_terms(cls, query_lower: str):
+        """Yield each conjunction/keyword occurrence in the query, left to right."""
+        for match in cls._SCAN_RE.finditer(query_lower):
+            yield match.group(1)
+    
     @classmethod
     def is_multi_intent(cls, query: str) -> bool:
         """Check if query contains multiple intents."""
-        query_lower = query.lower()
-        
-        # Check for conjunctions
-        for conj in cls.CONJUNCTIONS:
-            if conj in query_lower:
+        found_intents = set()
+        for term in cls._scan_terms(query.lower()):
+            # A conjunction, or a second distinct intent, settles it
+            if term in cls._CONJUNCTION_SET:
+                return True
+            found_intents.add(cls._KEYWORD_INTENTS[term])
+            if len(found_intents) > 1:
                 return True
         
-        # Check for multiple intent keywords
-        found_intents = []
-        for intent, keywords in cls.INTENT_KEYWORDS.items():
-            if any(kw in query_lower for kw in keywords):
-                found_intents.append(intent)
-        
-        return len(found_intents) > 1
+        return False
     
     @classmethod
     def decompose(cls, query: str) -> DecomposedQuery:
         """Decompose query into sub-queries with dependencies."""
         sub_queries = []
-        query_lower = query.lower()
+        present = set(cls._scan_terms(query.lower()))
         
-        # Find all intents in query
-        found_intents = []
+        # Intents in INTENT_KEYWORDS order, each with its first listed keyword present
+        unique_intents = []
         for intent, keywords in cls.INTENT_KEYWORDS.items():
             for kw in keywords:
-                if kw in query_lower:
-                    found_intents.append((intent, kw))
+                if kw in present:
+                    unique_intents.append((intent, kw))
                     break
         
-        # Remove duplicates while preserving order
-        seen = set()
-        unique_intents = []
-        for intent, kw in found_intents:
-            if intent not in seen:
-                seen.add(intent)
-                unique_intents.append((intent, kw))
-        
         # Create sub-queries
         for intent, keyword in unique_intents:
             agent = cls._intent_to_agent(intent)
@@ -372,27 +501,41 @@ class QueryDecomposer:
     
     @classmethod
     def _determine_order(cls, sub_queries: List[Dict], dependencies: Dict) -> List[List[str]]:
-        """Determine execution order based on dependencies."""
-        agents = list(set(sq["agent"] for sq in sub_queries))
-        executed = set()
+        """
+        Determine execution order based on dependencies (Kahn's algorithm).
+        Each batch holds the agents whose dependencies all ran in earlier
+        batches; agents keep their sub-query order within a batch.
+        """
+        agents = list(dict.fromkeys(sq["agent"] for sq in sub_queries))
+        
+        # Only dependencies on agents in this plan can block; each edge is counted once
+        indegree = {agent: 0 for agent in agents}
+        dependents: Dict[str, List[str]] = {agent: [] for agent in agents}
+        for agent in agents:
+            for dep in set(dependencies.get(agent, [])):
+                if dep in dependents and dep != agent:
+                    indegree[agent] += 1
+                    dependents[dep].append(agent)
+        
         order = []
+        batch = [agent for agent in agents if indegree[agent] == 0]
+        while batch:
+            order.append(batch)
+            ready = set()
+            for agent in batch:
+                for dependent in dependents[agent]:
+                    indegree[dependent] -= 1
+                    if indegree[dependent] == 0:
+                        ready.add(dependent)
+            batch = [agent for agent in agents if agent in ready]
         
-        while len(executed) < len(agents):
-            batch = []
-            for agent in agents:
-                if agent in executed:
-                    continue
-                deps = dependencies.get(agent, [])
-                if all(d in executed for d in deps):
-                    batch.append(agent)
-            
-            if batch:
-                order.append(batch)
-                executed.update(batch)
-            else:
-                # Circular dependency, add remaining
-                order.append([a for a in agents if a not in executed])
-                break
+        scheduled = sum(len(batch) for batch in order)
+        if scheduled < len(agents):
+            blocked = [agent for agent in agents if indegree[agent] > 0]
+            raise DependencyResolutionException(
+                f"Circular dependency between agents: {', '.join(blocked)}",
+                missing_deps=blocked
+            )
         
         return order
 
@@ -7,16 +7,21 @@ This module implements strategies to optimize context windows:
 3. Compressed context summaries
 4. Session-based memory with TTL
 """
+import asyncio
+import heapq
 import logging
-from typing import Dict, List, Any, Optional
+import threading
+import time
+from typing import Deque, Dict, Iterable, List, Any, Optional, Tuple
 from datetime import datetime, timedelta
 from dataclasses import dataclass, field
-from collections import OrderedDict
+from collections import OrderedDict, deque
+from itertools import islice
 
 logger = logging.getLogger(__name__)
 
 
-@dataclass
+@dataclass(slots=True)
 class ContextItem:
     """Single item in the context window."""
     key: str
@@ -27,6 +32,44 @@ class ContextItem:
     source: str = "user"  # user, agent, system
     
 
+@dataclass(slots=True)
+class Message:
+    """Single conversation message held in the context window."""
+    role: str
+    content: str
+    timestamp: str
+    metadata: Dict
+    token_estimate: int
+    
+    def to_dict(self) -> Dict:
+        return {
+            "role": self.role,
+            "content": self.content,
+            "timestamp": self.timestamp,
+            "metadata": self.metadata,
+            "token_estimate": self.token_estimate,
+        }
+
+
+@dataclass(slots=True)
+class EntityRef:
+    """Entity reference kept in context (ID and short summary, not data)."""
+    type: str
+    id: str
+    summary: Optional[str]
+    added_at: str
+    data: Optional[Dict] = None         # last fetched row, see get_entities()
+    fetched_at: Optional[float] = None  # time.monotonic() of that fetch
+    
+    def to_dict(self) -> Dict:
+        return {
+            "type": self.type,
+            "id": self.id,
+            "summary": self.summary,
+            "added_at": self.added_at,
+        }
+
+
 @dataclass
 class ConversationSummary:
     """Compressed summary of a conversation."""
@@ -37,6 +80,81 @@ class ConversationSummary:
     timestamp: datetime
 
 
+# === Entity loaders: ids -> {str(id): data}, one query per call ===
+
+def _load_orders(ids: List[str]) -> Dict[str, Dict]:
+    from apps.shopcore.models import Order
+    rows = Order.objects.filter(id__in=ids).values('id', 'product__name', 'status', 'total_amount')
+    return {
+        str(row['id']): {
+            "order_id": str(row['id']),
+            "product": row['product__name'],
+            "status": row['status'],
+            "amount": str(row['total_amount'])
+        }
+        for row in rows
+    }
+
+
+def _load_shipments(ids: List[str]) -> Dict[str, Dict]:
+    from apps.shipstream.models import Shipment
+    rows = Shipment.objects.filter(id__in=ids).values('id', 'tracking_number', 'current_status')
+    return {
+        str(row['id']): {
+            "shipment_id": str(row['id']),
+            "tracking": row['tracking_number'],
+            "status": row['current_status']
+        }
+        for row in rows
+    }
+
+
+def _load_transactions(ids: List[str]) -> Dict[str, Dict]:
+    from apps.payguard.models import Transaction
+    rows = Transaction.objects.filter(id__in=ids).values('id', 'transaction_type', 'amount', 'status')
+    return {
+        str(row['id']): {
+            "transaction_id": str(row['id']),
+            "type": row['transaction_type'],
+            "amount": str(row['amount']),
+            "status": row['status']
+        }
+        for row in rows
+    }
+
+
+def _load_tickets(ids: List[str]) -> Dict[str, Dict]:
+    from apps.caredesk.models import Ticket
+    rows = Ticket.objects.filter(id__in=ids).values('id', 'subject', 'status')
+    return {
+        str(row['id']): {
+            "ticket_id": str(row['id']),
+            "subject": row['subject'],
+            "status": row['status']
+        }
+        for row in rows
+    }
+
+
+_ENTITY_LOADERS = {
+    "order": _load_orders,
+    "shipment": _load_shipments,
+    "transaction": _load_transactions,
+    "ticket": _load_tickets,
+}
+
+
+def _first_unique(items: Iterable[Any], limit: Optional[int] = None) -> List[Any]:
+    """Distinct items in first-seen order, stopping once `limit` are found."""
+    seen = {}
+    for item in items:
+        if item not in seen:
+            seen[item] = None
+            if len(seen) == limit:
+                break
+    return list(seen)
+
+
 class ContextWindowManager:
     """
     Manages the context window for the orchestrator to optimize token usage.
@@ -52,13 +170,20 @@ class ContextWindowManager:
     MAX_CONTEXT_TOKENS = 4000  # Reserve tokens for context
     MAX_FULL_MESSAGES = 5      # Keep last N messages in full
     MAX_ENTITIES = 20          # Maximum entity references to keep
+    ENTITY_DATA_TTL_SECONDS = 30.0  # Reuse fetched entity data this long
     
     def __init__(self, session_id: str):
         self.session_id = session_id
-        self.messages: List[Dict] = []
+        # Deques so trimming pops from the left instead of copying slices
+        self.messages: Deque[Message] = deque()
         self.entities: OrderedDict = OrderedDict()  # LRU cache
         self.summaries: List[ConversationSummary] = []
         self.current_token_count = 0
+        # Inverted index for get_relevant_context: token -> absolute message
+        # numbers. Message i lives at self.messages[i - self._evicted_count].
+        self._message_tokens: Deque[frozenset] = deque()
+        self._token_postings: Dict[str, set] = {}
+        self._evicted_count = 0
         self.created_at = datetime.utcnow()
         self.last_activity = datetime.utcnow()
     
@@ -66,24 +191,48 @@ class ContextWindowManager:
         """
         Add a message to the context, applying optimization rules.
         """
-        message = {
-            "role": role,
-            "content": content,
-            "timestamp": datetime.utcnow().isoformat(),
-            "metadata": metadata or {}
-        }
-        
         # Estimate tokens (rough: 1 token ≈ 4 chars)
-        token_estimate = len(content) // 4
-        message["token_estimate"] = token_estimate
+        token_estimate = len(content) >> 2
+        
+        metadata = dict(metadata) if metadata else {}
+        if not isinstance(metadata.get("agents", []), list):
+            # Summaries iterate this directly; anything else never counted
+            metadata["agents"] = []
         
-        self.messages.append(message)
+        self.messages.append(Message(
+            role=role,
+            content=content,
+            timestamp=datetime.utcnow().isoformat(),
+            metadata=metadata,
+            token_estimate=token_estimate
+        ))
         self.current_token_count += token_estimate
+        self._index_message(content)
         self.last_activity = datetime.utcnow()
         
         # Apply optimization if over limit
         self._optimize_context()
     
+    def _index_message(self, content: str):
+        """Tokenize a new message once and add it to the postings."""
+        tokens = frozenset(content.lower().split())
+        position = self._evicted_count + len(self._message_tokens)
+        self._message_tokens.append(tokens)
+        for token in tokens:
+            self._token_postings.setdefault(token, set()).add(position)
+    
+    def _unindex_oldest(self, count: int):
+        """Drop the oldest `count` messages from the postings."""
+        popleft = self._message_tokens.popleft
+        for offset in range(count):
+            position = self._evicted_count + offset
+            for token in popleft():
+                positions = self._token_postings[token]
+                positions.discard(position)
+                if not positions:
+                    del self._token_postings[token]
+        self._evicted_count += count
+    
     def add_entity(self, entity_type: str, entity_id: str, summary: str = None):
         """
         Add an entity reference to context (ID only, not full data).
@@ -91,15 +240,17 @@ class ContextWindowManager:
         """
         key = f"{entity_type}:{entity_id}"
         
-        self.entities[key] = {
-            "type": entity_type,
-            "id": entity_id,
-            "summary": summary,  # Brief summary for context
-            "added_at": datetime.utcnow().isoformat()
-        }
+        self.entities[key] = EntityRef(
+            type=entity_type,
+            id=entity_id,
+            summary=summary,  # Brief summary for context
+            added_at=datetime.utcnow().isoformat()
+        )
+        # Re-assigning keeps an OrderedDict key in place; a re-mention is a use
+        self.entities.move_to_end(key)
         
         # LRU eviction
-        if len(self.entities) > self.MAX_ENTITIES:
+        while len(self.entities) > self.MAX_ENTITIES:
             self.entities.popitem(last=False)
     
     def get_entity(self, entity_type: str, entity_id: str) -> Optional[Dict]:
@@ -114,54 +265,65 @@ class ContextWindowManager:
             self.entities.move_to_end(key)
             
             # The entity reference is in context, now fetch fresh data
-            return self._fetch_from_database(entity_type, entity_id)
+            return self.get_entities({entity_type: [entity_id]}).get(key)
         
         return None
     
-    def _fetch_from_database(self, entity_type: str, entity_id: str) -> Optional[Dict]:
+    def get_entities(self, type_to_ids: Dict[str, List[str]]) -> Dict[str, Dict]:
+        """
+        Fetch data for many referenced entities, keyed "type:id".
+        
+        Data fetched within ENTITY_DATA_TTL_SECONDS is served from the
+        entity reference; the rest is loaded with one query per type.
         """
-        Fetch entity data from database.
+        results = {}
+        now = time.monotonic()
+        
+        for entity_type, entity_ids in type_to_ids.items():
+            stale = []
+            for entity_id in entity_ids:
+                ref = self.entities.get(f"{entity_type}:{entity_id}")
+                if ref and ref.data is not None and now - ref.fetched_at < self.ENTITY_DATA_TTL_SECONDS:
+                    results[f"{entity_type}:{entity_id}"] = ref.data
+                else:
+                    stale.append(entity_id)
+            
+            if not stale:
+                continue
+            
+            fetched = self._fetch_from_database(entity_type, stale)
+            for entity_id, data in fetched.items():
+                key = f"{entity_type}:{entity_id}"
+                results[key] = data
+                ref = self.entities.get(key)
+                if ref:
+                    ref.data = data
+                    ref.fetched_at = now
+        
+        return results
+    
+    def _fetch_from_database(self, entity_type: str, entity_ids: List[str]) -> Dict[str, Dict]:
+        """
+        Fetch entity data from database, one query for all IDs of a type.
         This saves tokens by not keeping full data in context.
         """
+        loader = _ENTITY_LOADERS.get(entity_type)
+        if loader is None:
+            return {}
+        
         try:
-            if entity_type == "order":
-                from apps.shopcore.models import Order
-                order = Order.objects.select_related('user', 'product').get(id=entity_id)
-                return {
-                    "order_id": str(order.id),
-                    "product": order.product.name,
-                    "status": order.status,
-                    "amount": str(order.total_amount)
-                }
-            elif entity_type == "shipment":
-                from apps.shipstream.models import Shipment
-                shipment = Shipment.objects.get(id=entity_id)
-                return {
-                    "shipment_id": str(shipment.id),
-                    "tracking": shipment.tracking_number,
-                    "status": shipment.current_status
-                }
-            elif entity_type == "transaction":
-                from apps.payguard.models import Transaction
-                trans = Transaction.objects.get(id=entity_id)
-                return {
-                    "transaction_id": str(trans.id),
-                    "type": trans.transaction_type,
-                    "amount": str(trans.amount),
-                    "status": trans.status
-                }
-            elif entity_type == "ticket":
-                from apps.caredesk.models import Ticket
-                ticket = Ticket.objects.get(id=entity_id)
-                return {
-                    "ticket_id": str(ticket.id),
-                    "subject": ticket.subject,
-                    "status": ticket.status
-                }
+            rows = loader(entity_ids)
         except Exception as e:
-            logger.error(f"Error fetching {entity_type} {entity_id}: {e}")
+            logger.error(f"Error fetching {entity_type} {entity_ids}: {e}")
+            return {}
         
-        return None
+        # Map back to the caller's ID strings
+        wanted = {str(entity_id).lower(): entity_id for entity_id in entity_ids}
+        return {
+            wanted[row_id]: data
+            for row_id, data in rows.items()
+            if row_id in wanted
+        }
     
     def _optimize_context(self):
         """
@@ -175,53 +337,57 @@ class ContextWindowManager:
         
         # Keep last N messages in full
         if len(self.messages) > self.MAX_FULL_MESSAGES:
-            old_messages = self.messages[:-self.MAX_FULL_MESSAGES]
-            self.messages = self.messages[-self.MAX_FULL_MESSAGES:]
+            popleft = self.messages.popleft
+            old_messages = [popleft() for _ in range(len(self.messages) - self.MAX_FULL_MESSAGES)]
+            self._unindex_oldest(len(old_messages))
             
             # Create summary of old messages
             summary = self._create_summary(old_messages)
             self.summaries.append(summary)
             
-            # Recalculate token count
-            self.current_token_count = sum(
-                m.get("token_estimate", 0) for m in self.messages
-            )
+            # Only the evicted slice changes the running total
+            self.current_token_count -= sum(m.token_estimate for m in old_messages)
         
         logger.info(f"Context optimized: {self.current_token_count} tokens")
     
-    def _create_summary(self, messages: List[Dict]) -> ConversationSummary:
+    def _recent_messages(self) -> Iterable[Message]:
+        """The last MAX_FULL_MESSAGES messages, without copying the deque."""
+        return islice(self.messages, max(0, len(self.messages) - self.MAX_FULL_MESSAGES), None)
+    
+    def _create_summary(self, messages: List[Message]) -> ConversationSummary:
         """
         Create a compressed summary of messages.
         This drastically reduces token usage for older context.
         """
-        user_messages = [m["content"] for m in messages if m["role"] == "user"]
-        agent_messages = [m["metadata"].get("agents", []) for m in messages if m["role"] == "assistant"]
+        user_intent = next((m.content[:100] for m in messages if m.role == "user"), "")
         
-        # Extract key information
-        entities = []
-        agents = []
-        for msg in messages:
-            if "metadata" in msg:
-                entities.extend(msg["metadata"].get("entities", []))
-                agents.extend(msg["metadata"].get("agents", []))
+        # Extract key information, first occurrences in conversation order
+        entities_mentioned = _first_unique(
+            (e for msg in messages for e in msg.metadata.get("entities", [])),
+            limit=10
+        )
+        agents_consulted = _first_unique(
+            a for msg in messages if msg.role == "assistant" for a in msg.metadata.get("agents", [])
+        )
         
         return ConversationSummary(
-            user_intent=user_messages[0][:100] if user_messages else "",
-            entities_mentioned=list(set(entities))[:10],
-            agents_consulted=list(set(a for sublist in agent_messages for a in (sublist if isinstance(sublist, list) else []))),
+            user_intent=user_intent,
+            entities_mentioned=entities_mentioned,
+            agents_consulted=agents_consulted,
             key_findings=["Conversation summarized for token optimization"],
             timestamp=datetime.utcnow()
         )
     
-    def get_context_for_llm(self) -> Dict:
+    def get_context_for_llm(self, with_entity_data: bool = False) -> Dict:
         """
         Get optimized context ready for LLM consumption.
         Returns minimal data needed for continuation.
+        With with_entity_data, referenced entities are loaded in one batch.
         """
         context = {
             "session_id": self.session_id,
-            "messages": self.messages[-self.MAX_FULL_MESSAGES:],
-            "entity_references": list(self.entities.values())[-10:],
+            "messages": [m.to_dict() for m in self._recent_messages()],
+            "entity_references": [e.to_dict() for e in list(self.entities.values())[-10:]],
             "summaries": [
                 {
                     "intent": s.user_intent,
@@ -233,6 +399,14 @@ class ContextWindowManager:
             "token_estimate": self.current_token_count
         }
         
+        if with_entity_data:
+            type_to_ids: Dict[str, List[str]] = {}
+            for ref in context["entity_references"]:
+                type_to_ids.setdefault(ref["type"], []).append(ref["id"])
+            entity_data = self.get_entities(type_to_ids)
+            for ref in context["entity_references"]:
+                ref["data"] = entity_data.get(f"{ref['type']}:{ref['id']}")
+        
         return context
     
     def get_relevant_context(self, query: str) -> Dict:
@@ -240,19 +414,19 @@ class ContextWindowManager:
         Get only context relevant to the current query.
         Further reduces tokens by filtering.
         """
-        # Keywords to match
-        keywords = set(query.lower().split())
+        # Messages sharing any keyword with the query, via the postings
+        hits = set()
+        for keyword in set(query.lower().split()):
+            hits.update(self._token_postings.get(keyword, ()))
         
-        # Filter messages to only relevant ones
-        relevant_messages = []
-        for msg in self.messages:
-            msg_words = set(msg["content"].lower().split())
-            if keywords & msg_words:  # Intersection
-                relevant_messages.append(msg)
+        relevant_messages = [
+            self.messages[position - self._evicted_count].to_dict()
+            for position in sorted(hits)[-3:]  # Last 3 relevant
+        ]
         
         return {
-            "messages": relevant_messages[-3:],  # Last 3 relevant
-            "entities": list(self.entities.values())[-5:]
+            "messages": relevant_messages,
+            "entities": [e.to_dict() for e in list(self.entities.values())[-5:]]
         }
 
 
@@ -260,44 +434,134 @@ class SessionMemoryStore:
     """
     Store for managing multiple session contexts.
     Implements TTL-based cleanup.
+    
+    Expiry is lazy: a session is checked when it is accessed, and a full
+    sweep runs every SWEEP_INTERVAL. On a long-lived event loop (the ASGI
+    lifespan calls start_sweeper) the sweep is a background task; otherwise
+    it runs inline, at most once per interval, from get_or_create. Request
+    loops made by async_to_sync are too short-lived to host it. The
+    sessions and heap are guarded by a lock, since callers may be worker
+    threads and the sweep task. The sweep walks a min-heap
+    of (last_activity, session_id) entries, so it only touches sessions
+    that may have expired. Entries go stale when a session sees activity;
+    they are refreshed when popped rather than on every message.
     """
     
     SESSION_TTL = timedelta(hours=24)
+    SWEEP_INTERVAL = timedelta(seconds=60)
     MAX_SESSIONS = 1000
     
     def __init__(self):
         self._sessions: Dict[str, ContextWindowManager] = {}
+        self._expiry_heap: List[Tuple[datetime, str]] = []
+        self._last_sweep = datetime.utcnow()
+        self._sweep_task: Optional[asyncio.Task] = None
+        self._lock = threading.Lock()
     
     def get_or_create(self, session_id: str) -> ContextWindowManager:
         """Get existing session or create new one."""
-        self._cleanup_expired()
-        
-        if session_id not in self._sessions:
-            self._sessions[session_id] = ContextWindowManager(session_id)
+        now = datetime.utcnow()
+        with self._lock:
+            if not self._sweeper_running() and now - self._last_sweep > self.SWEEP_INTERVAL:
+                self._cleanup_expired(now)
+            
+            ctx = self._sessions.get(session_id)
+            if ctx is not None and now - ctx.last_activity > self.SESSION_TTL:
+                # Expired since the last sweep; start over as the sweep would have
+                logger.debug(f"Cleaned up expired session: {session_id}")
+                ctx = None
+            
+            if ctx is None:
+                ctx = ContextWindowManager(session_id)
+                self._sessions[session_id] = ctx
+                heapq.heappush(self._expiry_heap, (ctx.last_activity, session_id))
+                if len(self._sessions) > self.MAX_SESSIONS:
+                    self._evict_oldest()
         
-        return self._sessions[session_id]
+        return ctx
     
-    def _cleanup_expired(self):
-        """Remove expired sessions to free memory."""
-        now = datetime.utcnow()
-        expired = [
-            sid for sid, ctx in self._sessions.items()
-            if now - ctx.last_activity > self.SESSION_TTL
-        ]
+    def start_sweeper(self):
+        """
+        Run the sweep as a task on the running loop, which must outlive the
+        requests (e.g. from the ASGI lifespan startup event).
+        """
+        if not self._sweeper_running():
+            self._sweep_task = asyncio.get_running_loop().create_task(self._sweep_loop())
+    
+    async def stop_sweeper(self):
+        """Cancel the sweep task; get_or_create goes back to inline sweeps."""
+        task, self._sweep_task = self._sweep_task, None
+        if task is not None and not task.done():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+    
+    def _sweeper_running(self) -> bool:
+        # A task left pending on a closed loop never reports done()
+        task = self._sweep_task
+        return task is not None and not task.done() and not task.get_loop().is_closed()
+    
+    async def _sweep_loop(self):
+        """Expire sessions every SWEEP_INTERVAL, off the request path."""
+        interval = self.SWEEP_INTERVAL.total_seconds()
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                with self._lock:
+                    self._cleanup_expired()
+            except Exception as e:
+                logger.error(f"Session sweep failed: {e}")
+    
+    def _pop_current(self) -> Optional[Tuple[datetime, str]]:
+        """
+        Pop the heap entry of the least recently active session.
+        Entries for removed sessions are dropped; entries older than the
+        session's last_activity are re-pushed with the current value.
+        """
+        heap = self._expiry_heap
+        while heap:
+            last_activity, sid = heap[0]
+            ctx = self._sessions.get(sid)
+            if ctx is None:
+                heapq.heappop(heap)
+            elif ctx.last_activity != last_activity:
+                heapq.heapreplace(heap, (ctx.last_activity, sid))
+            else:
+                return heapq.heappop(heap)
+        return None
+    
+    def _cleanup_expired(self, now: Optional[datetime] = None):
+        """Remove expired sessions to free memory. Caller holds _lock."""
+        now = now or datetime.utcnow()
+        self._last_sweep = now
+        cutoff = now - self.SESSION_TTL
         
-        for sid in expired:
+        heap = self._expiry_heap
+        while heap and heap[0][0] < cutoff:
+            entry = self._pop_current()
+            if entry is None:
+                break
+            last_activity, sid = entry
+            if last_activity >= cutoff:
+                # Refreshed entry is still live; everything behind it is newer
+                heapq.heappush(heap, entry)
+                break
             del self._sessions[sid]
             logger.debug(f"Cleaned up expired session: {sid}")
         
         # Also limit total sessions
         if len(self._sessions) > self.MAX_SESSIONS:
-            # Remove oldest sessions
-            sorted_sessions = sorted(
-                self._sessions.items(),
-                key=lambda x: x[1].last_activity
-            )
-            for sid, _ in sorted_sessions[:len(self._sessions) - self.MAX_SESSIONS]:
-                del self._sessions[sid]
+            self._evict_oldest()
+    
+    def _evict_oldest(self):
+        """Remove the least recently active sessions down to MAX_SESSIONS."""
+        while len(self._sessions) > self.MAX_SESSIONS:
+            entry = self._pop_current()
+            if entry is None:
+                break
+            del self._sessions[entry[1]]
 
 
 # Global session store
@@ -12,25 +12,38 @@ State Machine Flow:
                    ↓
                  ERROR ────────────────────────→ COMPLETE
 """
+import hashlib
 import logging
-from typing import Dict, Any, Optional
-from datetime import datetime
+import threading
+import time
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from typing import AsyncIterator, Dict, Any, Literal, Optional
 
+import orjson
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from langgraph.cache.base import BaseCache
+from langgraph.cache.memory import InMemoryCache
 from langgraph.graph import StateGraph, END
 from langgraph.checkpoint.memory import MemorySaver
+from langgraph.types import CachePolicy
 
+from apps.core.llm import llm_scope
+from apps.core.utils import elapsed_ms
 from .state import (
-    OrchestratorState, AgentState, create_initial_state,
-    create_parallel_execution_plan
+    OrchestratorState, AgentState, create_initial_state
 )
 from .nodes import (
+    start_routing,
+    fast_path,
     analyze_query,
     create_execution_plan,
-    execute_agents_parallel,
+    fan_out_agents,
+    agent_worker,
+    collect_batch,
     synthesize_response,
-    handle_error,
-    route_after_analysis,
-    should_continue_execution
+    handle_error
 )
 
 logger = logging.getLogger(__name__)
@@ -40,7 +53,17 @@ logger = logging.getLogger(__name__)
 # GRAPH ROUTING FUNCTIONS
 # =============================================================================
 
-def route_from_analysis(state: OrchestratorState) -> str:
+def route_from_fast_path(state: OrchestratorState) -> Literal["analyze", "create_plan", "handle_error"]:
+    """
+    Route after the fast path (ROUTING state): a hit skips the LLM analysis
+    and is validated like an analysis result.
+    """
+    if state.get("fast_path_hit"):
+        return route_from_analysis(state)
+    return "analyze"
+
+
+def route_from_analysis(state: OrchestratorState) -> Literal["create_plan", "handle_error"]:
     """
     Route after query analysis (ROUTING state).
     Returns next node based on analysis results.
@@ -60,41 +83,126 @@ def route_from_analysis(state: OrchestratorState) -> str:
     return "create_plan"
 
 
-def route_from_execution(state: OrchestratorState) -> str:
+def route_after_batch(state: OrchestratorState):
+    """
+    Route after a batch of agents has been collected (EXECUTING state).
+    Sends the next batch to the workers, or leaves execution once all
+    batches have run.
+    """
+    if state.get("current_batch_index", 0) < len(state.get("parallel_batches", [])):
+        return fan_out_agents(state)
+    return route_from_execution(state)
+
+
+def route_from_execution(state: OrchestratorState) -> Literal["synthesize", "handle_error"]:
     """
     Route after agent execution (EXECUTING state).
     """
     if state.get("error"):
         return "handle_error"
     
-    agent_results = state.get("agent_results", {})
-    
-    if not agent_results:
-        logger.warning("[ROUTER] No agent results, routing to error")
-        return "handle_error"
-    
-    # Check if any agent succeeded
-    any_success = any(r.get("success") for r in agent_results.values())
-    
-    if not any_success:
-        logger.warning("[ROUTER] All agents failed, routing to error")
+    # Filled in by the workers as they finish
+    if not state.get("successful_agents"):
+        logger.warning("[ROUTER] No agent succeeded, routing to error")
         return "handle_error"
     
     logger.info("[ROUTER] Execution complete, routing to synthesis")
     return "synthesize"
 
 
-def route_from_error(state: OrchestratorState) -> str:
-    """Route from error handling."""
-    return END
+# =============================================================================
+# NODE CACHING
+# =============================================================================
+
+def _digest(payload: bytes) -> str:
+    return hashlib.blake2b(payload, digest_size=16).hexdigest()
+
+
+def analysis_cache_key(state: OrchestratorState) -> str:
+    """Node-cache key for analyze: the query text, case/whitespace-insensitive."""
+    return _digest(" ".join(state["user_query"].lower().split()).encode())
+
+
+def agent_cache_key(task: Dict[str, Any]) -> str:
+    """
+    Node-cache key for agent_worker: agent, query, entities and the context
+    handed over from earlier batches (dependent agents read it).
+    """
+    return _digest(orjson.dumps(
+        [task["agent"], task["query"], task["entities"], task["context"]],
+        option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS,
+        default=str
+    ))
+
+
+def _has_failure(writes) -> bool:
+    """
+    True if a node's writes carry an unsuccessful AgentResult or a fallback
+    classification (analyze_query after an LLM error).
+    """
+    for channel, value in writes:
+        if channel == "agent_results" and not all(result.get("success", False) for result in value.values()):
+            return True
+        if channel == "classified_by" and value == "fallback":
+            return True
+    return False
+
+
+class SuccessOnlyCache(BaseCache):
+    """
+    Node cache wrapper that never stores failed runs.
+    
+    agent_worker and analyze_query report errors as ordinary output (a
+    success=False result, a default shopcore routing) so the query can
+    still be answered; LangGraph would cache those like any other write
+    and replay a transient failure for the whole TTL.
+    """
+    
+    def __init__(self, inner: BaseCache):
+        super().__init__(serde=inner.serde)
+        self.inner = inner
+    
+    @staticmethod
+    def _successful(pairs):
+        return {
+            key: (writes, ttl) for key, (writes, ttl) in pairs.items()
+            if not _has_failure(writes)
+        }
+    
+    def get(self, keys):
+        return self.inner.get(keys)
+    
+    async def aget(self, keys):
+        return await self.inner.aget(keys)
+    
+    def set(self, pairs):
+        pairs = self._successful(pairs)
+        if pairs:
+            self.inner.set(pairs)
+    
+    async def aset(self, pairs):
+        pairs = self._successful(pairs)
+        if pairs:
+            await self.inner.aset(pairs)
+    
+    def clear(self, namespaces=None):
+        self.inner.clear(namespaces)
+    
+    async def aclear(self, namespaces=None):
+        await self.inner.aclear(namespaces)
 
 
-def is_complete(state: OrchestratorState) -> str:
-    """Check if workflow is complete."""
-    current_state = state.get("current_state")
-    if current_state == AgentState.COMPLETE:
-        return END
-    return "continue"
+def create_node_cache():
+    """
+    Backend for node-level caching: Redis when LANGGRAPH_CONFIG['node_cache']
+    is 'redis' (shared across workers), otherwise in-process memory. Failed
+    runs are never stored.
+    """
+    if settings.LANGGRAPH_CONFIG.get('node_cache') == 'redis':
+        from redis import Redis
+        from langgraph.cache.redis import RedisCache
+        return SuccessOnlyCache(RedisCache(Redis.from_url(settings.REDIS_URL)))
+    return SuccessOnlyCache(InMemoryCache())
 
 
 # =============================================================================
@@ -110,15 +218,23 @@ def create_orchestrator_graph() -> StateGraph:
     START
       │
       ▼
-    analyze_query (LISTENING → ROUTING)
-      │
-      ├─── error ──→ handle_error
+    start_routing (LISTENING → ROUTING)
       │
       ▼
-    create_plan (Plan parallel batches)
+    fast_path (intent cache / patterns / decomposition, no LLM)
+      │
+      ├─── miss ──→ analyze_query (LLM, cached per query)
+      │                 │
+      ├─── error ───────┼──→ handle_error
+      │                 │
+      ▼  hit            ▼
+    create_plan (Plan parallel batches, ROUTING → EXECUTING)
+      │
+      ▼  Send × agents in batch
+    agent_worker ×N (one node instance per agent, same superstep; cached)
       │
       ▼
-    execute_agents (ROUTING → EXECUTING)
+    collect_batch ── more batches ──→ agent_worker (Send × next batch)
       │
       ├─── error ──→ handle_error
       │
@@ -132,15 +248,39 @@ def create_orchestrator_graph() -> StateGraph:
     # Create graph with state schema
     workflow = StateGraph(OrchestratorState)
     
+    analysis_ttl = settings.LANGGRAPH_CONFIG.get('analysis_cache_ttl_seconds', 300)
+    agent_ttl = settings.LANGGRAPH_CONFIG.get('agent_cache_ttl_seconds', 60)
+    
     # Add nodes
-    workflow.add_node("analyze", analyze_query)
+    workflow.add_node("start_routing", start_routing)
+    workflow.add_node("fast_path", fast_path)
+    workflow.add_node(
+        "analyze", analyze_query,
+        cache_policy=CachePolicy(key_func=analysis_cache_key, ttl=analysis_ttl)
+    )
     workflow.add_node("create_plan", create_execution_plan)
-    workflow.add_node("execute", execute_agents_parallel)
+    workflow.add_node(
+        "agent_worker", agent_worker,
+        cache_policy=CachePolicy(key_func=agent_cache_key, ttl=agent_ttl)
+    )
+    workflow.add_node("collect_batch", collect_batch)
     workflow.add_node("synthesize", synthesize_response)
     workflow.add_node("handle_error", handle_error)
     
     # Set entry point
-    workflow.set_entry_point("analyze")
+    workflow.set_entry_point("start_routing")
+    workflow.add_edge("start_routing", "fast_path")
+    
+    # Pattern/cache hits skip the LLM analysis
+    workflow.add_conditional_edges(
+        "fast_path",
+        route_from_fast_path,
+        {
+            "analyze": "analyze",
+            "create_plan": "create_plan",
+            "handle_error": "handle_error"
+        }
+    )
     
     # Add conditional edges from analysis
     workflow.add_conditional_edges(
@@ -152,17 +292,17 @@ def create_orchestrator_graph() -> StateGraph:
         }
     )
     
-    # Linear edge from plan to execute
-    workflow.add_edge("create_plan", "execute")
+    # Fan out the first batch: one agent_worker per agent via Send
+    workflow.add_conditional_edges("create_plan", fan_out_agents, ["agent_worker"])
+    
+    # Workers of a batch join at collect_batch (once per superstep)
+    workflow.add_edge("agent_worker", "collect_batch")
     
-    # Add conditional edges from execution
+    # Next batch, or leave execution
     workflow.add_conditional_edges(
-        "execute",
-        route_from_execution,
-        {
-            "synthesize": "synthesize",
-            "handle_error": "handle_error"
-        }
+        "collect_batch",
+        route_after_batch,
+        ["agent_worker", "synthesize", "handle_error"]
     )
     
     # Terminal edges
@@ -172,9 +312,30 @@ def create_orchestrator_graph() -> StateGraph:
     return workflow
 
 
-# Create compiled graph with memory checkpointing
-memory = MemorySaver()
-orchestrator_graph = create_orchestrator_graph().compile(checkpointer=memory)
+_graph_lock = threading.Lock()
+
+
+@lru_cache(maxsize=1)
+def _compile_orchestrator_graph():
+    return create_orchestrator_graph().compile(
+        checkpointer=MemorySaver(),
+        cache=create_node_cache()
+    )
+
+
+def get_orchestrator_graph():
+    """
+    Compile the graph once per process, on first use rather than at import.
+    
+    lru_cache alone lets concurrent first callers each compile; the lock
+    makes them wait for the one compile instead.
+    
+    MemorySaver is the default checkpointer; with
+    LANGGRAPH_CONFIG['checkpoint_db'] set, each run swaps in a SQLite saver
+    (OrchestratorService._checkpointed_graph).
+    """
+    with _graph_lock:
+        return _compile_orchestrator_graph()
 
 
 # =============================================================================
@@ -191,9 +352,46 @@ class OrchestratorService:
     """
     
     def __init__(self):
-        self.graph = orchestrator_graph
+        self.graph = get_orchestrator_graph()
+        self.checkpoint_db = settings.LANGGRAPH_CONFIG.get('checkpoint_db')
         logger.info("[SERVICE] OrchestratorService initialized")
     
+    @asynccontextmanager
+    async def _checkpointed_graph(self) -> AsyncIterator[Any]:
+        """
+        The graph bound to the persistent checkpointer, if one is configured.
+        
+        AsyncSqliteSaver ties itself to the running event loop, and the sync
+        shim may run each call on a different loop, so a saver (one SQLite
+        connection) is opened per run instead of once per process.
+        """
+        if not self.checkpoint_db:
+            yield self.graph
+            return
+        
+        from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+        async with AsyncSqliteSaver.from_conn_string(self.checkpoint_db) as saver:
+            yield self.graph.copy(update={"checkpointer": saver})
+    
+    @staticmethod
+    async def _resume_input(graph, config: Dict, initial_state: Dict) -> Optional[Dict]:
+        """
+        Input for this run: None to resume the thread's last checkpoint when
+        a run of the same query stopped part-way (e.g. a worker restart),
+        so completed nodes and agents are not run again; otherwise the
+        fresh initial state.
+        """
+        snapshot = await graph.aget_state(config)
+        values = snapshot.values or {}
+        if (
+            snapshot.next
+            and values.get("user_query") == initial_state["user_query"]
+            and values.get("current_state") != AgentState.COMPLETE
+        ):
+            logger.info(f"[SERVICE] Resuming from checkpoint before {snapshot.next}")
+            return None
+        return initial_state
+    
     def process_query(
         self,
         query: str,
@@ -203,6 +401,9 @@ class OrchestratorService:
         """
         Process a user query through the multi-agent orchestrator.
         
+        Sync entry point for WSGI views and scripts; runs aprocess_query
+        on an event loop via async_to_sync.
+        
         Args:
             query: User's natural language query
             session_id: Session identifier for conversation continuity
@@ -211,7 +412,52 @@ class OrchestratorService:
         Returns:
             Dictionary with response and metadata
         """
-        start_time = datetime.utcnow()
+        return async_to_sync(self.aprocess_query)(
+            query=query,
+            session_id=session_id,
+            conversation_history=conversation_history
+        )
+    
+    async def aprocess_query(
+        self,
+        query: str,
+        session_id: str,
+        conversation_history: list = None
+    ) -> Dict[str, Any]:
+        """
+        Async variant of process_query for ASGI callers.
+        
+        The graph runs on the event loop: LLM calls are awaited and the
+        agents of a batch are gathered concurrently, so a request's latency
+        is bounded by its slowest agent rather than the sum of them.
+        Collects the final event of process_query_stream.
+        """
+        async for event in self.process_query_stream(
+            query, session_id, conversation_history, tokens=False
+        ):
+            if event["event"] == "final":
+                return event["result"]
+    
+    async def process_query_stream(
+        self,
+        query: str,
+        session_id: str,
+        conversation_history: list = None,
+        tokens: bool = True
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Process a query, yielding progress while the graph runs:
+        
+            {"event": "node", "node": ...}     each time a node finishes
+            {"event": "token", "content": ...} synthesis output as it is
+                                               generated (if tokens=True)
+            {"event": "final", "result": ...}  the process_query response,
+                                               always last
+        
+        Clients see routing and agent progress (and the answer's first
+        tokens) long before the whole pipeline completes.
+        """
+        start_ns = time.perf_counter_ns()
         logger.info(f"[SERVICE] Processing query: {query[:50]}...")
         
         # Create initial state
@@ -228,40 +474,71 @@ class OrchestratorService:
             }
         }
         
+        # "values" is kept for the final state; it is not forwarded
+        stream_mode = ["updates", "values", "messages"] if tokens else ["updates", "values"]
+        final_state = {}
+        
         try:
-            # Execute the graph
-            final_state = self.graph.invoke(initial_state, config)
+            # Execute the graph, resuming an interrupted run of this query;
+            # LLM calls share this loop's async pool until the run ends
+            async with llm_scope(), self._checkpointed_graph() as graph:
+                graph_input = await self._resume_input(graph, config, initial_state)
+                async for mode, chunk in graph.astream(graph_input, config, stream_mode=stream_mode):
+                    if mode == "values":
+                        final_state = chunk
+                    elif mode == "updates":
+                        for node, update in chunk.items():
+                            yield self._node_event(node, update or {})
+                    else:
+                        message, metadata = chunk
+                        if metadata.get("langgraph_node") == "synthesize" and message.content:
+                            yield {"event": "token", "content": message.content}
             
-            # Build response
-            response = {
-                "success": True,
-                "response": final_state.get("final_response", ""),
-                "session_id": session_id,
-                "intent": final_state.get("intent", ""),
-                "intent_confidence": final_state.get("intent_confidence", 0),
-                "agents_used": final_state.get("agents_used", []),
-                "execution_details": {
-                    "state_history": self._format_state_history(final_state.get("state_history", [])),
-                    "execution_times": final_state.get("execution_times", {}),
-                    "parallel_batches": final_state.get("parallel_batches", []),
-                    "agent_results": self._format_agent_results(final_state.get("agent_results", {}))
-                },
-                "total_time_ms": (datetime.utcnow() - start_time).total_seconds() * 1000
-            }
-            
-            logger.info(f"[SERVICE] Query processed in {response['total_time_ms']:.0f}ms")
-            return response
+            result = self._build_response(final_state, session_id, start_ns)
+            logger.info(f"[SERVICE] Query processed in {result['total_time_ms']:.0f}ms")
             
         except Exception as e:
             logger.error(f"[SERVICE] Error processing query: {e}")
-            return {
+            result = {
                 "success": False,
                 "response": f"I apologize, but I encountered an error: {str(e)}",
                 "session_id": session_id,
                 "error": str(e),
                 "agents_used": [],
-                "total_time_ms": (datetime.utcnow() - start_time).total_seconds() * 1000
+                "total_time_ms": elapsed_ms(start_ns)
             }
+        
+        yield {"event": "final", "result": result}
+    
+    @staticmethod
+    def _node_event(node: str, update: Dict[str, Any]) -> Dict[str, Any]:
+        """Progress event for a finished node (a small summary, not its writes)."""
+        event = {"event": "node", "node": node}
+        if update.get("current_state"):
+            event["state"] = update["current_state"]
+        if update.get("intent"):
+            event["intent"] = update["intent"]
+        if node == "agent_worker":
+            event["agents"] = list(update.get("agent_results", {}))
+        return event
+    
+    def _build_response(self, final_state: Dict[str, Any], session_id: str, start_ns: int) -> Dict[str, Any]:
+        """Build the process_query response from the graph's final state."""
+        return {
+            "success": True,
+            "response": final_state.get("final_response", ""),
+            "session_id": session_id,
+            "intent": final_state.get("intent", ""),
+            "intent_confidence": final_state.get("intent_confidence", 0),
+            "agents_used": final_state.get("agents_used", []),
+            "execution_details": {
+                "state_history": self._format_state_history(final_state.get("state_history", [])),
+                "execution_times": final_state.get("execution_times", {}),
+                "parallel_batches": final_state.get("parallel_batches", []),
+                "agent_results": self._format_agent_results(final_state.get("agent_results", {}))
+            },
+            "total_time_ms": elapsed_ms(start_ns)
+        }
     
     def _format_state_history(self, history: list) -> list:
         """Format state history for API response."""
@@ -275,17 +552,8 @@ class OrchestratorService:
         return formatted
     
     def _format_agent_results(self, results: dict) -> list:
-        """Format agent results for API response."""
-        formatted = []
-        for agent_name, result in results.items():
-            formatted.append({
-                "agent_name": agent_name,
-                "success": result.get("success", False),
-                "data": result.get("data", []),
-                "execution_time_ms": result.get("execution_time_ms", 0),
-                "error": result.get("error")
-            })
-        return formatted
+        """Agent results for API response (stored in response shape by agent_worker)."""
+        return list(results.values())
     
     def get_available_tools(self) -> list:
         """Get list of available tools for documentation."""
@@ -298,7 +566,3 @@ class OrchestratorService:
                 "description": tool.description
             })
         return tools_info
-
-
-# Create singleton service instance
-orchestrator_service = OrchestratorService()
@@ -14,6 +14,8 @@ from dataclasses import dataclass, field
 from datetime import datetime
 from enum import Enum
 
+from apps.core.utils import elapsed_ms
+
 logger = logging.getLogger(__name__)
 
 
@@ -64,12 +66,12 @@ class ReasoningChain:
         self.query = query
         self.session_id = session_id
         self.steps: List[ThoughtStep] = []
-        self.start_time = time.time()
-        self.current_step_start: float = 0.0
+        self.start_ns = time.perf_counter_ns()
+        self.current_step_start_ns: int = 0
     
     def start_step(self):
         """Mark start of a step for timing."""
-        self.current_step_start = time.time()
+        self.current_step_start_ns = time.perf_counter_ns()
     
     def add_step(
         self,
@@ -80,14 +82,14 @@ class ReasoningChain:
         metadata: Dict = None
     ):
         """Add a reasoning step to the chain."""
-        duration = (time.time() - self.current_step_start) * 1000 if self.current_step_start else 0
+        duration = elapsed_ms(self.current_step_start_ns) if self.current_step_start_ns else 0
         
         step = ThoughtStep(
             step_type=step_type,
             thought=thought,
             decision=decision,
             confidence=confidence,
-            timestamp=time.time() - self.start_time,
+            timestamp=elapsed_ms(self.start_ns) / 1000,
             duration_ms=duration,
             metadata=metadata or {}
         )
@@ -117,7 +119,7 @@ class ReasoningChain:
             lines.append(f"   ✅ Decision: {step.decision}")
             lines.append(f"   📊 Confidence: {step.confidence:.0%} | Time: {step.duration_ms:.0f}ms")
         
-        total_time = (time.time() - self.start_time) * 1000
+        total_time = elapsed_ms(self.start_ns)
         lines.append(f"\n{'='*60}")
         lines.append(f"TOTAL TIME: {total_time:.0f}ms")
         lines.append(f"{'='*60}\n")
@@ -7,9 +7,10 @@ This module implements:
 3. Tool definitions for Django API access
 4. Relevant output extraction
 """
-from typing import TypedDict, List, Dict, Any, Optional, Literal
+from typing import Annotated, TypedDict, List, Dict, Any, Optional, Literal
 from dataclasses import dataclass, field
 from enum import Enum
+from itertools import groupby
 import operator
 from langgraph.graph import add_messages
 from langchain_core.messages import BaseMessage
@@ -64,6 +65,37 @@ class ExtractedEntity:
     source: str = "user_query"
 
 
+def merge_dicts(left: Optional[Dict], right: Optional[Dict]) -> Dict:
+    """
+    Reducer for maps written by parallel agent workers: updates are merged
+    key by key, so concurrent writes in one superstep don't overwrite each
+    other. An empty update clears the map; that is how each new query
+    (create_initial_state) starts fresh on a checkpointed thread.
+    """
+    if not right:
+        return {}
+    if not left:
+        return dict(right)
+    return {**left, **right}
+
+
+class AgentTask(TypedDict):
+    """Input of one agent_worker node instance (sent by fan_out_agents)"""
+    agent: str
+    query: str
+    context: Dict[str, Any]
+    entities: List[Dict[str, str]]
+
+
+class AgentResult(TypedDict):
+    """One agent's outcome, stored in the shape the API returns"""
+    agent_name: str
+    success: bool
+    data: Any
+    execution_time_ms: float
+    error: Optional[str]
+
+
 class OrchestratorState(TypedDict, total=False):
     """
     Complete State Schema for the Super Agent Orchestrator.
@@ -87,9 +119,11 @@ class OrchestratorState(TypedDict, total=False):
     # === Analysis Phase (ROUTING) ===
     intent: str
     intent_confidence: float
+    classified_by: str  # "pattern", "decomposition", "llm" or "fallback" (LLM failed; a cache hit keeps its original source)
     entities: List[ExtractedEntity]
     required_agents: List[AgentRequirement]
     complexity_score: int  # 1-10 scale
+    fast_path_hit: bool  # Classified without the LLM (fast_path node)
     
     # === Planning Phase ===
     execution_plan: ExecutionPlan
@@ -97,9 +131,10 @@ class OrchestratorState(TypedDict, total=False):
     
     # === Execution Phase (EXECUTING) ===
     current_batch_index: int
-    agent_results: Dict[str, Dict[str, Any]]
+    agent_results: Annotated[Dict[str, AgentResult], merge_dicts]
     accumulated_context: Dict[str, Any]
-    execution_times: Dict[str, float]  # Agent name → execution time in ms
+    execution_times: Annotated[Dict[str, float], merge_dicts]  # Agent name → execution time in ms
+    successful_agents: Annotated[Dict[str, bool], merge_dicts]  # Written by workers whose agent succeeded
     
     # === Output Phase (ANSWERING) ===
     relevant_data: Dict[str, Any]  # Filtered, relevant data only
@@ -202,9 +237,11 @@ def create_initial_state(
         # Analysis (to be filled)
         intent="",
         intent_confidence=0.0,
+        classified_by="",
         entities=[],
         required_agents=[],
         complexity_score=0,
+        fast_path_hit=False,
         
         # Planning
         execution_plan=None,
@@ -215,6 +252,7 @@ def create_initial_state(
         agent_results={},
         accumulated_context={},
         execution_times={},
+        successful_agents={},
         
         # Output
         relevant_data={},
@@ -231,6 +269,48 @@ def create_initial_state(
 
 # === Parallel Execution Helpers ===
 
+# Static agent DAG: ShopCore resolves the order the other agents look up
+AGENT_DEPENDENCY_LEVELS: Dict[str, int] = {
+    "shopcore": 0,
+    "shipstream": 1,
+    "payguard": 1,
+    "caredesk": 1,
+}
+
+
+def _dependency_levels(dependencies: Dict[str, List[str]]) -> Dict[str, Optional[int]]:
+    """
+    Level of each agent in one pass: 0 with no dependencies, otherwise one
+    past its deepest dependency. Dependencies on agents outside the plan are
+    ignored; agents on or behind a cycle get None.
+    """
+    levels: Dict[str, Optional[int]] = {}
+    visiting = set()
+    
+    def level_of(agent: str) -> Optional[int]:
+        if agent in levels:
+            return levels[agent]
+        if agent in visiting:
+            return None
+        visiting.add(agent)
+        level = 0
+        for dep in dependencies[agent]:
+            if dep not in dependencies:
+                continue
+            dep_level = level_of(dep)
+            if dep_level is None:
+                level = None
+                break
+            level = max(level, dep_level + 1)
+        visiting.discard(agent)
+        levels[agent] = level
+        return level
+    
+    for agent in dependencies:
+        level_of(agent)
+    return levels
+
+
 def create_parallel_execution_plan(
     required_agents: List[AgentRequirement]
 ) -> ExecutionPlan:
@@ -241,28 +321,21 @@ def create_parallel_execution_plan(
     - Batch 0: Agents with no dependencies (run in parallel)
     - Batch 1: Agents depending on Batch 0 (run in parallel after Batch 0)
     - etc.
+    Agents caught in a circular dependency run together in a final batch.
     """
-    # Build dependency graph
     dependencies = {req.agent_name: req.depends_on for req in required_agents}
-    all_agents = set(req.agent_name for req in required_agents)
+    levels = _dependency_levels(dependencies)
+    cyclic_level = max((level for level in levels.values() if level is not None), default=-1) + 1
     
-    batches = []
-    scheduled = set()
+    def batch_key(agent: str) -> int:
+        level = levels[agent]
+        return cyclic_level if level is None else level
     
-    while scheduled != all_agents:
-        # Find agents whose dependencies are all satisfied
-        current_batch = []
-        for agent in all_agents - scheduled:
-            deps = dependencies.get(agent, [])
-            if all(dep in scheduled for dep in deps):
-                current_batch.append(agent)
-        
-        if not current_batch:
-            # Circular dependency or missing agent, schedule remaining
-            current_batch = list(all_agents - scheduled)
-        
-        batches.append(current_batch)
-        scheduled.update(current_batch)
+    # sorted() is stable, so each batch keeps the order the agents were requested in
+    batches = [
+        list(batch)
+        for _, batch in groupby(sorted(dependencies, key=batch_key), key=batch_key)
+    ]
     
     return ExecutionPlan(
         batches=batches,
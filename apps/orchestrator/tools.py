@@ -8,7 +8,6 @@ This module implements:
 4. Error handling and retry logic
 """
 import logging
-import json
 from typing import Dict, List, Any, Optional, Callable
 from dataclasses import dataclass, field
 from functools import wraps
@@ -6,23 +6,25 @@ This agent handles queries related to:
 - Warehouse information
 - Delivery events and history
 """
-import json
 import logging
 import re
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Tuple
 
 from django.db import connection
-from langchain_openai import ChatOpenAI
 from langchain_core.messages import SystemMessage, HumanMessage
 
 from django.conf import settings
-from apps.core.utils import sanitize_sql, extract_json_from_response
+from apps.core.llm import get_process_llm
+from apps.core.utils import sanitize_sql, extract_json_from_response, rows_to_dicts, iter_cursor_rows
 from apps.core.exceptions import SQLGenerationException, SQLExecutionException
 from .schemas import get_schema_prompt, SHIPSTREAM_SCHEMA
 from .models import Shipment, Warehouse, TrackingEvent
 
 logger = logging.getLogger(__name__)
 
+# Fallback for LLM replies that contain bare SQL instead of the JSON envelope
+_SELECT_RE = re.compile(r'SELECT[^;]+', re.IGNORECASE | re.DOTALL)
+
 
 SHIPSTREAM_SYSTEM_PROMPT = """You are a SQL expert for the ShipStream logistics database.
 Your job is to convert natural language queries into safe, read-only SQL queries.
@@ -51,14 +53,17 @@ class ShipStreamAgent:
     Handles: Shipments, Warehouses, TrackingEvents
     """
     
+    name = "shipstream"
+    CAPABILITIES = (
+        "Track shipment by order ID or tracking number",
+        "Get current package location",
+        "View delivery history and events",
+        "Check estimated arrival time",
+        "Find package at specific warehouse",
+    )
+    
     def __init__(self):
-        self.name = "shipstream"
-        self.llm = ChatOpenAI(
-            model=settings.LLM_MODEL,
-            api_key=settings.GITHUB_TOKEN,
-            base_url=settings.LLM_BASE_URL,
-            temperature=0,
-        )
+        self.llm = get_process_llm(settings.LLM_MODEL)
         self.schema_prompt = get_schema_prompt()
     
     def execute(
@@ -232,7 +237,7 @@ Generate a SQL query to answer this question. Only query the shipstream_* tables
             if result and 'sql' in result:
                 sql = result['sql']
             else:
-                sql_match = re.search(r'SELECT[^;]+', response.content, re.IGNORECASE | re.DOTALL)
+                sql_match = _SELECT_RE.search(response.content)
                 if sql_match:
                     sql = sql_match.group(0)
                 else:
@@ -252,19 +257,7 @@ Generate a SQL query to answer this question. Only query the shipstream_* tables
             with connection.cursor() as cursor:
                 cursor.execute(sql)
                 columns = [col[0] for col in cursor.description] if cursor.description else []
-                rows = cursor.fetchall()
-                
-                results = []
-                for row in rows:
-                    result = {}
-                    for i, col in enumerate(columns):
-                        value = row[i]
-                        if hasattr(value, 'isoformat'):
-                            value = value.isoformat()
-                        elif hasattr(value, '__str__'):
-                            value = str(value)
-                        result[col] = value
-                    results.append(result)
+                results = rows_to_dicts(columns, iter_cursor_rows(cursor))
                 
                 logger.info(f"SQL returned {len(results)} rows")
                 return results
@@ -273,12 +266,6 @@ Generate a SQL query to answer this question. Only query the shipstream_* tables
             logger.error(f"Error executing SQL: {e}")
             raise SQLExecutionException(self.name, sql, str(e))
     
-    def get_capabilities(self) -> List[str]:
-        """Return list of capabilities this agent supports."""
-        return [
-            "Track shipment by order ID or tracking number",
-            "Get current package location",
-            "View delivery history and events",
-            "Check estimated arrival time",
-            "Find package at specific warehouse",
-        ]
+    def get_capabilities(self) -> Tuple[str, ...]:
+        """Return the capabilities this agent supports."""
+        return self.CAPABILITIES
@@ -0,0 +1,29 @@
+# Generated by Django 6.0.1 on 2026-10-16 10:20
+
+import apps.core.uuid7
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shipstream', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='warehouse',
+            name='id',
+            field=models.UUIDField(default=apps.core.uuid7.uuid7, editable=False, primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='shipment',
+            name='id',
+            field=models.UUIDField(default=apps.core.uuid7.uuid7, editable=False, primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='trackingevent',
+            name='id',
+            field=models.UUIDField(default=apps.core.uuid7.uuid7, editable=False, primary_key=True, serialize=False),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 6.0.1 on 2026-10-16 11:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shipstream', '0002_uuid7_primary_keys'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='trackingevent',
+            index=models.Index(fields=['shipment', '-timestamp'], name='idx_tracking_event_recent'),
+        ),
+    ]
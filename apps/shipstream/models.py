@@ -119,6 +119,10 @@ class TrackingEvent(BaseModel):
         verbose_name = 'Tracking Event'
         verbose_name_plural = 'Tracking Events'
         ordering = ['-timestamp']
+        indexes = [
+            # Latest events of a shipment: one index range scan per shipment
+            models.Index(fields=['shipment', '-timestamp'], name='idx_tracking_event_recent'),
+        ]
     
     def __str__(self):
         return f"{self.shipment.tracking_number} - {self.status_update} at {self.timestamp}"
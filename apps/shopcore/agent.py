@@ -6,23 +6,25 @@ This agent handles queries related to:
 - Product catalog and information
 - Order placement and status
 """
-import json
 import logging
 import re
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Tuple
 
 from django.db import connection
-from langchain_openai import ChatOpenAI
 from langchain_core.messages import SystemMessage, HumanMessage
 
 from django.conf import settings
-from apps.core.utils import sanitize_sql, extract_json_from_response
+from apps.core.llm import get_process_llm
+from apps.core.utils import sanitize_sql, extract_json_from_response, rows_to_dicts, iter_cursor_rows
 from apps.core.exceptions import SQLGenerationException, SQLExecutionException
 from .schemas import get_schema_prompt, SHOPCORE_SCHEMA
 from .models import User, Product, Order
 
 logger = logging.getLogger(__name__)
 
+# Fallback for LLM replies that contain bare SQL instead of the JSON envelope
+_SELECT_RE = re.compile(r'SELECT[^;]+', re.IGNORECASE | re.DOTALL)
+
 
 SHOPCORE_SYSTEM_PROMPT = """You are a SQL expert for the ShopCore e-commerce database.
 Your job is to convert natural language queries into safe, read-only SQL queries.
@@ -52,14 +54,17 @@ class ShopCoreAgent:
     Handles: Users, Products, Orders
     """
     
+    name = "shopcore"
+    CAPABILITIES = (
+        "Find orders by user or product",
+        "Get order status and details",
+        "Search products by name or category",
+        "Look up user information",
+        "List recent orders",
+    )
+    
     def __init__(self):
-        self.name = "shopcore"
-        self.llm = ChatOpenAI(
-            model=settings.LLM_MODEL,
-            api_key=settings.GITHUB_TOKEN,
-            base_url=settings.LLM_BASE_URL,
-            temperature=0,
-        )
+        self.llm = get_process_llm(settings.LLM_MODEL)
         self.schema_prompt = get_schema_prompt()
     
     def execute(
@@ -236,7 +241,7 @@ Remember: table names are shopcore_users, shopcore_products, shopcore_orders.
             if result and 'sql' in result:
                 sql = result['sql']
             else:
-                sql_match = re.search(r'SELECT[^;]+', response.content, re.IGNORECASE | re.DOTALL)
+                sql_match = _SELECT_RE.search(response.content)
                 if sql_match:
                     sql = sql_match.group(0)
                 else:
@@ -258,19 +263,7 @@ Remember: table names are shopcore_users, shopcore_products, shopcore_orders.
             with connection.cursor() as cursor:
                 cursor.execute(sql)
                 columns = [col[0] for col in cursor.description] if cursor.description else []
-                rows = cursor.fetchall()
-                
-                results = []
-                for row in rows:
-                    result = {}
-                    for i, col in enumerate(columns):
-                        value = row[i]
-                        if hasattr(value, 'isoformat'):
-                            value = value.isoformat()
-                        elif hasattr(value, '__str__'):
-                            value = str(value)
-                        result[col] = value
-                    results.append(result)
+                results = rows_to_dicts(columns, iter_cursor_rows(cursor))
                 
                 logger.info(f"SQL returned {len(results)} rows")
                 return results
@@ -279,12 +272,6 @@ Remember: table names are shopcore_users, shopcore_products, shopcore_orders.
             logger.error(f"Error executing SQL: {e}")
             raise SQLExecutionException(self.name, sql, str(e))
     
-    def get_capabilities(self) -> List[str]:
-        """Return list of capabilities this agent supports."""
-        return [
-            "Find orders by user or product",
-            "Get order status and details",
-            "Search products by name or category",
-            "Look up user information",
-            "List recent orders",
-        ]
+    def get_capabilities(self) -> Tuple[str, ...]:
+        """Return the capabilities this agent supports."""
+        return self.CAPABILITIES
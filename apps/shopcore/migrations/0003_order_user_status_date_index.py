@@ -0,0 +1,17 @@
+# Generated by Django 6.0.1 on 2026-10-16 11:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shopcore', '0002_uuid7_primary_keys'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', 'status', '-order_date'], name='idx_order_user_status_date'),
+        ),
+    ]
@@ -89,6 +89,10 @@ class Order(BaseModel):
         verbose_name = 'Order'
         verbose_name_plural = 'Orders'
         ordering = ['-order_date']
+        indexes = [
+            # A user's orders by status, newest first (query_orders filters)
+            models.Index(fields=['user', 'status', '-order_date'], name='idx_order_user_status_date'),
+        ]
     
     def __str__(self):
         return f"Order {self.id} - {self.user.name} - {self.product.name}"
@@ -2,6 +2,7 @@
 ShopCore Database Schema Definition
 Used by the ShopCore agent for text-to-SQL generation
 """
+from functools import lru_cache
 
 SHOPCORE_SCHEMA = {
     "database": "DB_ShopCore",
@@ -69,32 +70,36 @@ SHOPCORE_SCHEMA = {
 }
 
 
-def get_schema_prompt() -> str:
-    """Generate a prompt-friendly schema description."""
-    lines = [
-        f"# {SHOPCORE_SCHEMA['database']} Schema",
-        f"{SHOPCORE_SCHEMA['description']}\n",
-        "## Tables\n"
-    ]
+def _column_row(col: dict) -> str:
+    """Render one column as a markdown table row."""
+    constraints = []
+    if col.get('primary_key'):
+        constraints.append("PK")
+    if col.get('foreign_key'):
+        constraints.append(f"FK→{col['foreign_key']}")
+    if col.get('unique'):
+        constraints.append("UNIQUE")
     
-    for table in SHOPCORE_SCHEMA['tables']:
-        lines.append(f"### {table['name']}")
-        lines.append(f"{table['description']}\n")
-        lines.append("| Column | Type | Description |")
-        lines.append("|--------|------|-------------|")
-        
-        for col in table['columns']:
-            constraints = []
-            if col.get('primary_key'):
-                constraints.append("PK")
-            if col.get('foreign_key'):
-                constraints.append(f"FK→{col['foreign_key']}")
-            if col.get('unique'):
-                constraints.append("UNIQUE")
-            
-            constraint_str = f" [{', '.join(constraints)}]" if constraints else ""
-            lines.append(f"| {col['name']} | {col['type']}{constraint_str} | {col['description']} |")
-        
-        lines.append("")
+    constraint_str = f" [{', '.join(constraints)}]" if constraints else ""
+    return f"| {col['name']} | {col['type']}{constraint_str} | {col['description']} |"
+
+
+def _iter_schema_lines(schema: dict):
+    """Yield the schema prompt line by line."""
+    yield f"# {schema['database']} Schema"
+    yield f"{schema['description']}\n"
+    yield "## Tables\n"
     
-    return '\n'.join(lines)
+    for table in schema['tables']:
+        yield f"### {table['name']}"
+        yield f"{table['description']}\n"
+        yield "| Column | Type | Description |"
+        yield "|--------|------|-------------|"
+        yield from map(_column_row, table['columns'])
+        yield ""
+
+
+@lru_cache(maxsize=1)
+def get_schema_prompt() -> str:
+    """Generate a prompt-friendly schema description (built once per process)."""
+    return '\n'.join(_iter_schema_lines(SHOPCORE_SCHEMA))
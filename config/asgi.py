@@ -5,4 +5,29 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from apps.orchestrator.context import session_store  # noqa: E402  (after django.setup())
+
+
+async def lifespan(receive, send):
+    """
+    ASGI lifespan protocol, which Django's handler does not accept: runs the
+    session sweep on the server's long-lived loop for the process lifetime.
+    """
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            session_store.start_sweeper()
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await session_store.stop_sweeper()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "lifespan":
+        await lifespan(receive, send)
+    else:
+        await django_application(scope, receive, send)
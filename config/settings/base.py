@@ -108,7 +108,7 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 REST_FRAMEWORK = {
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
+        'api.renderers.OrjsonRenderer',
     ],
     'DEFAULT_PARSER_CLASSES': [
         'rest_framework.parsers.JSONParser',
@@ -151,12 +151,30 @@ CACHES = {
 GITHUB_TOKEN = os.getenv('GITHUB_TOKEN', '')
 LLM_BASE_URL = "https://models.github.ai/inference"
 LLM_MODEL = "openai/gpt-4.1"
+# LLM HTTP pool per process, shared by all concurrent queries and agents
+LLM_MAX_CONNECTIONS = int(os.getenv('LLM_MAX_CONNECTIONS', '64'))
+LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv('LLM_MAX_KEEPALIVE_CONNECTIONS', '32'))
+# Queries matched by an ORM pattern at or above this confidence, with at
+# most two rows to report, are answered from a template instead of an LLM
+# synthesis call; set above 1.0 to always synthesize
+TEMPLATE_SYNTHESIS_THRESHOLD = float(os.getenv('TEMPLATE_SYNTHESIS_THRESHOLD', '0.85'))
 
 # LangGraph Configuration
 LANGGRAPH_CONFIG = {
     'max_iterations': 10,
     'timeout_seconds': 60,
     'retry_count': 3,
+    # Agents running at once across all requests in a process
+    'max_concurrent_agents': 8,
+    # Node-level result cache: 'memory' (per process) or 'redis' (REDIS_URL)
+    'node_cache': os.getenv('LANGGRAPH_NODE_CACHE', 'memory'),
+    'analysis_cache_ttl_seconds': 300,
+    'agent_cache_ttl_seconds': 60,
+    # Opt-in SQLite file for graph checkpoints, so an interrupted run can
+    # resume after a restart. Every node of every request is written to it
+    # and nothing prunes old threads; keep it outside the source tree.
+    # Empty (default) keeps checkpoints in process memory.
+    'checkpoint_db': os.getenv('LANGGRAPH_CHECKPOINT_DB', ''),
 }
 
 # Logging Configuration
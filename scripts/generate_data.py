@@ -424,13 +424,15 @@ def generate_surveys(tickets):
     surveyed_tickets = random.sample(closed_tickets, min(len(closed_tickets), len(closed_tickets) // 2))
     
     for ticket in surveyed_tickets:
-        survey = SatisfactionSurvey.objects.create(
+        surveys.append(SatisfactionSurvey(
             ticket=ticket,
             rating=random.choices([1, 2, 3, 4, 5], weights=[5, 10, 15, 30, 40])[0],
             comments=fake.paragraph(nb_sentences=1) if random.random() > 0.5 else None,
             would_recommend=random.choice([True, True, True, False])
-        )
-        surveys.append(survey)
+        ))
+    
+    # Rating bounds are a DB constraint, so a single bulk insert is safe
+    surveys = SatisfactionSurvey.objects.bulk_create(surveys)
     
     print(f"Created {len(surveys)} surveys")
     return surveys